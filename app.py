@@ -1,140 +1,241 @@
 import os
-import requests
+import time
 import asyncio
 import logging
 from dotenv import load_dotenv
-from discord.errors import Forbidden, NotFound, HTTPException
-from storage import get_streamers, init_db, get_all_guild_ids, get_server_data, get_youtube_settings, setup_database
-from bs4 import BeautifulSoup
-import re
+import storage
+from storage import get_streamers, get_all_guild_ids, get_server_data, get_youtube_settings, get_youtube_subscriptions, setup_database, seen_releases, live_state
+from http_client import HttpClient, HttpError
+import live_status
+import metrics
+import tracing
+from scheduler import PollScheduler, partition_of
+from ratelimit import TokenBucket, backoff_delay
+from youtube_feed import YouTubeFeedFetcher
+from notifier import NotificationDispatcher
+from shards import POLL_PARTITIONS
 
 # Load environment variables
 load_dotenv()
 
-# Initialize the database
-init_db()
-setup_database()
-
 CLIENT_ID = os.getenv('CLIENT_ID')
 CLIENT_SECRET = os.getenv('CLIENT_SECRET')
 
-CHECK_INTERVAL = 60
-TWITCH_API_URL = "https://api.twitch.tv/helix/streams"
-
-notified_streams = {}
+CHECK_INTERVAL = 60  # Default seconds between checks of each streamer and YouTube channel
+SCHEDULER_TICK = 5  # Longest the poller sleeps before re-reading subscriptions
+EVENTSUB_RECONCILE_INTERVAL = 600  # Poll period while EventSub delivers go-live events
+TWITCH_API_URL = os.getenv('TWITCH_API_URL', "https://api.twitch.tv/helix/streams")
+TWITCH_TOKEN_URL = os.getenv('TWITCH_TOKEN_URL', "https://id.twitch.tv/oauth2/token")
+TOKEN_REFRESH_MARGIN = 300  # Refresh the token this many seconds before it expires
+TWITCH_BATCH_SIZE = 100  # Helix accepts at most 100 user_login params per request
+TWITCH_RATE_LIMIT = 800  # Helix points per minute for an app token, corrected from response headers
+TWITCH_MAX_RETRIES = 3
+YOUTUBE_CONCURRENCY = 4  # Parallel connections to youtube.com, kept low to avoid being throttled
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_oauth_token():
-    """Fetch OAuth token from Twitch."""
-    url = "https://id.twitch.tv/oauth2/token"
-    payload = {
-        'client_id': CLIENT_ID,
-        'client_secret': CLIENT_SECRET,
-        'grant_type': 'client_credentials'
-    }
-    response = requests.post(url, data=payload)
-    try:
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Error fetching OAuth token: {e}")
-        logger.error(f"Response content: {response.content.decode()}")
-        raise
-    return response.json()['access_token']
-
-def check_stream_status(access_token, streamer):
-    """Check if a Twitch stream is live."""
+http_session = HttpClient(host_limits={'www.youtube.com': YOUTUBE_CONCURRENCY})
+poll_scheduler = PollScheduler(CHECK_INTERVAL)
+twitch_bucket = TokenBucket(TWITCH_RATE_LIMIT, 60)
+youtube_fetcher = YouTubeFeedFetcher(http_session)
+notification_dispatcher = NotificationDispatcher()
+poll_partitions = None  # (owned partition numbers, partition count) when this process polls only its share of the keys
+remote_poller = None  # Set in the bot process when polling runs in worker processes
+_subscriptions = None  # (guild cache version, guild streamers, YouTube subscriptions) as last loaded by poll_cycle
+
+metrics.queue_depth.labels('notifications').set_function(notification_dispatcher.pending)
+metrics.Gauge('streamguard_twitch_rate_limit_remaining', 'Helix points left in the current window.').set_function(lambda: twitch_bucket.remaining)
+
+class TwitchTokenManager:
+    """Process-wide cache for the Twitch app access token.
+
+    The token is reused until shortly before it expires, or until a caller
+    reports it was rejected. Concurrent callers that find the token stale
+    wait on a single in-flight refresh instead of each posting to id.twitch.tv.
+    """
+
+    def __init__(self, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._lock = asyncio.Lock()
+        # (token, monotonic expiry) swapped as one tuple so lock-free readers see a consistent pair
+        self._cached = (None, 0.0)
+
+    def _fresh_token(self):
+        token, expires_at = self._cached
+        if token is not None and time.monotonic() < expires_at - self.refresh_margin:
+            return token
+        return None
+
+    async def get_token(self):
+        """Return a valid access token, refreshing it if needed."""
+        token = self._fresh_token()
+        if token:
+            return token
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            token = self._fresh_token()
+            if not token:
+                token = await self._refresh()
+            return token
+
+    def invalidate(self, token):
+        """Drop the cached token after Twitch rejected it with a 401.
+
+        Only the given token is dropped, so callers that all saw the same 401
+        cause one refresh between them.
+        """
+        if self._cached[0] == token:
+            self._cached = (None, 0.0)
+
+    async def _refresh(self):
+        payload = {
+            'client_id': CLIENT_ID,
+            'client_secret': CLIENT_SECRET,
+            'grant_type': 'client_credentials'
+        }
+        response = await http_session.post(TWITCH_TOKEN_URL, data=payload)
+        try:
+            response.raise_for_status()
+        except HttpError as e:
+            logger.error(f"Error fetching OAuth token: {e}")
+            logger.error(f"Response content: {response.text}")
+            raise
+        data = response.json()
+        self._cached = (data['access_token'], time.monotonic() + data.get('expires_in', 0))
+        logger.info(f"Fetched new Twitch OAuth token, expires in {data.get('expires_in')} seconds")
+        return data['access_token']
+
+token_manager = TwitchTokenManager()
+
+async def get_oauth_token():
+    """Fetch OAuth token from Twitch, reusing the cached one while it is valid."""
+    return await token_manager.get_token()
+
+async def helix_request(method, url, access_token=None, **kwargs):
+    """Send a Helix API request and return the successful HttpResponse.
+
+    Each request takes a point from twitch_bucket first. A 401 refreshes the
+    token once, 429s wait for the bucket's reset, and 5xx or transport errors
+    back off, up to TWITCH_MAX_RETRIES retries. After that HttpError is
+    raised. Extra keyword arguments are passed to the HTTP client.
+    """
+    if access_token is None:
+        access_token = await get_oauth_token()
     headers = {
         'Client-ID': CLIENT_ID,
         'Authorization': f'Bearer {access_token}'
     }
-    params = {'user_login': streamer}
-    logger.info(f"Sending request to Twitch API for streamer: {streamer}")
-    response = requests.get(TWITCH_API_URL, headers=headers, params=params)
-    try:
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Error checking stream status for {streamer}: {e}")
-        logger.error(f"Response content: {response.content.decode()}")
-        return None
-    data = response.json()
-    logger.info(f"Received response from Twitch API for streamer {streamer}: {data}")
-    if data['data']:
-        logger.info(f"Streamer {streamer} is live")
-        return {
-            'title': data['data'][0]['title'],
-            'category': data['data'][0]['game_name'],
-            'url': f"https://www.twitch.tv/{streamer}"
-        }
-    logger.info(f"Streamer {streamer} is not live")
-    return None
+    token_refreshed = False
+    attempt = 0
+    while True:
+        await twitch_bucket.acquire()
+        try:
+            response = await http_session.request(method, url, headers=headers, **kwargs)
+        except HttpError as e:
+            if attempt >= TWITCH_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Twitch request failed ({e}), retrying in {delay:.1f}s")
+        else:
+            twitch_bucket.update_from_headers(response.headers)
+            if response.status == 401 and not token_refreshed:
+                logger.warning("Twitch rejected the OAuth token, refreshing and retrying")
+                token_manager.invalidate(access_token)
+                access_token = await get_oauth_token()
+                headers['Authorization'] = f'Bearer {access_token}'
+                token_refreshed = True
+                continue
+            if response.status == 429 or response.status >= 500:
+                if attempt >= TWITCH_MAX_RETRIES:
+                    response.raise_for_status()
+                if response.status == 429:
+                    delay = twitch_bucket.pause_until_reset(response.headers)
+                else:
+                    delay = backoff_delay(attempt)
+                logger.warning(f"Twitch API returned {response.status}, retrying in {delay:.1f}s")
+            else:
+                response.raise_for_status()
+                return response
+        attempt += 1
+        await asyncio.sleep(delay)
 
-async def send_discord_message(channel_id, message, role_id=None):
-    from bot import bot  # Import bot instance here to avoid circular import issues
+async def _fetch_streams_chunk(access_token, chunk):
+    """Fetch one Helix /streams page for up to TWITCH_BATCH_SIZE logins.
 
-    try:
-        logger.info(f"Attempting to send message to channel ID {channel_id}")
-        channel = bot.get_channel(int(channel_id))
-        if channel is None:
-            logger.info(f"Channel not found in cache, attempting to fetch")
-            try:
-                channel = await bot.fetch_channel(int(channel_id))
-            except Exception as e:
-                logger.error(f"Error fetching channel: {e}")
-                return
-
-        if channel:
-            if role_id:
-                role_mention = f"<@&{role_id}>"
-                message = f"{role_mention} {message}"
-
-            logger.info(f"Sending message: {message[:50]}...")
-            await channel.send(message)
-            logger.info(f"Message sent successfully to channel ID {channel_id}")
-        else:
-            logger.error(f"Channel with ID {channel_id} not found. Ensure the bot has access to this channel.")
-            logger.info(f"Bot is connected to the following guilds: {[guild.name for guild in bot.guilds]}")
-            for guild in bot.guilds:
-                logger.info(f"Guild: {guild.name} (ID: {guild.id})")
-                for ch in guild.channels:
-                    logger.info(f"Channel: {ch.name} (ID: {ch.id})")
-    except Exception as e:
-        logger.error(f"Error in send_discord_message: {e}")
-    await asyncio.sleep(0)
-
-def get_youtube_releases(channel_name):
-    """Fetch new song releases from a YouTube channel's releases page."""
-    url = f"https://www.youtube.com/@{channel_name}/releases"
-    response = requests.get(url)
-    if response.status_code != 200:
-        logger.error(f"Failed to fetch YouTube releases for channel {channel_name}")
-        return None
+    Raises HttpError once retries run out, so the chunk's status stays
+    unknown instead of reading as offline.
+    """
+    params = [('user_login', login) for login in chunk]
+    logger.debug("Sending request to Twitch API for %d streamer(s)", len(chunk))
+    with tracing.span('helix.streams', logins=len(chunk)):
+        response = await helix_request('GET', TWITCH_API_URL, access_token, params=params)
+    return response.json()['data']
+
+def get_rate_limit_status():
+    """Current client-side view of the Helix rate-limit budget."""
+    return {'limit': twitch_bucket.capacity, 'remaining': twitch_bucket.remaining}
+
+async def check_streams_status(access_token, streamers):
+    """Check which of the given Twitch streamers are live.
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-    releases = []
+    Logins are sent to Helix in chunks of up to TWITCH_BATCH_SIZE per request,
+    with the chunks fetched concurrently. Returns a dict mapping each
+    lowercased login to its stream info, or to None if the streamer is
+    offline. Logins from a chunk whose request failed are left out of the
+    map, since their status is unknown.
+    """
+    logins = sorted({streamer.lower() for streamer in streamers})
+    chunks = [logins[start:start + TWITCH_BATCH_SIZE] for start in range(0, len(logins), TWITCH_BATCH_SIZE)]
+    with tracing.span('twitch.check', streamers=len(logins)):
+        results = await asyncio.gather(*(_fetch_streams_chunk(access_token, chunk) for chunk in chunks),
+                                       return_exceptions=True)
+    statuses = {}
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error checking stream status for {len(chunk)} streamer(s): {result}")
+            if isinstance(result, HttpError) and result.response is not None:
+                logger.error(f"Response content: {result.response.text}")
+            continue
+        statuses.update(dict.fromkeys(chunk))
+        for stream in result:
+            login = stream['user_login'].lower()
+            statuses[login] = {
+                'id': stream['id'],
+                'title': stream['title'],
+                'category': stream['game_name'],
+                'started_at': stream.get('started_at'),
+                'url': f"https://www.twitch.tv/{login}"
+            }
+        logger.debug("Received response from Twitch API: %d of %d streamer(s) live", len(result), len(chunk))
+    return statuses
 
-    # Find all video items
-    video_items = soup.find_all('div', {'id': 'dismissible', 'class': 'style-scope ytd-grid-video-renderer'})
+async def check_stream_status(access_token, streamer):
+    """Check if a Twitch stream is live."""
+    return (await check_streams_status(access_token, [streamer])).get(streamer.lower())
 
-    for item in video_items:
-        title_element = item.find('yt-formatted-string', {'id': 'video-title'})
-        if title_element:
-            title = title_element.text.strip()
+async def send_discord_message(channel_id, message, role_id=None):
+    """Send a message through the notification dispatcher and wait for its DeliveryResult."""
+    logger.debug("Sending message to channel ID %s: %.50s...", channel_id, message)
+    with tracing.span('discord.send'):
+        return await notification_dispatcher.submit(channel_id, message, role_id)
 
-            # Extract video ID from the href attribute
-            video_id_match = re.search(r'href="/watch\?v=([^"]+)"', str(item))
-            video_id = video_id_match.group(1) if video_id_match else None
+async def get_youtube_releases(channel_name, conditional=True):
+    """Fetch the latest uploads from a YouTube channel's Atom feed.
 
-            if video_id:
-                video_url = f"https://www.youtube.com/watch?v={video_id}"
-                releases.append({"title": title, "url": video_url})
+    Returns an empty list when the feed hasn't changed since the last fetch,
+    and None if it couldn't be fetched. conditional=False always fetches
+    the full feed.
+    """
+    with tracing.span('youtube.fetch'):
+        return await youtube_fetcher.fetch(channel_name, conditional)
 
-    return releases
+async def post_youtube_releases(channel_id, channel_name, role_id=None, releases=None):
+    """Post new YouTube releases to a Discord channel.
 
-async def post_youtube_releases(channel_id, channel_name, role_id=None):
-    """Post new YouTube releases to a Discord channel."""
-    releases = get_youtube_releases(channel_name)
+    Pass releases to reuse a fetch shared between several guilds.
+    """
+    if releases is None:
+        releases = await get_youtube_releases(channel_name)
     if releases:
         message = f"🎵 New releases from @{channel_name} on YouTube:\n\n"
         for release in releases[:5]:  # Limit to 5 releases to avoid too long messages
@@ -142,69 +243,240 @@ async def post_youtube_releases(channel_id, channel_name, role_id=None):
 
         await send_discord_message(channel_id, message, role_id)
     else:
-        logger.info(f"No new releases found for YouTube channel {channel_name}")
+        logger.debug("No new releases found for YouTube channel %s", channel_name)
         
+async def notify_twitch_statuses(guild_streamers, statuses):
+    """Announce streams that went live and forget streams that ended.
+
+    Only streamers present in statuses are considered; the rest were not
+    checked this time, or their status is unknown. The cycle's changes to
+    live_state are written in one batch before the announcements are handed
+    to the dispatcher, without waiting for them to be sent; the returned
+    futures resolve to their DeliveryResults.
+    """
+    deliveries = []
+    for guild_id, streamers in guild_streamers.items():
+        for streamer in streamers:
+            if streamer.lower() not in statuses:
+                continue
+            stream_info = statuses[streamer.lower()]
+            if stream_info and live_state.should_announce(guild_id, streamer, stream_info.get('id')):
+                logger.debug("Streamer %s is live. Attempting to send notification.", streamer)
+                server_data = get_server_data(guild_id)
+                channel_id = server_data.get('channel_id')
+                role_id = server_data.get('role_id')
+                if channel_id:
+                    # Claim the stream before sending, so an EventSub event and a poll can't both announce it
+                    live_state.mark_live(guild_id, streamer, stream_info.get('id'))
+                    message = f"🔴 {streamer} is now live on Twitch!\n\nTitle: {stream_info['title']}\nPlaying: {stream_info['category']}\nhttps://twitch.tv/{streamer}"
+                    deliveries.append((channel_id, message, role_id))
+                else:
+                    logger.warning(f"No channel_id found for guild {guild_id}")
+            elif not stream_info and live_state.is_live(guild_id, streamer):
+                logger.debug("Streamer %s is no longer live. Removing from notified list.", streamer)
+                live_state.mark_offline(guild_id, streamer)
+    try:
+        with tracing.span('live_state.flush'):
+            live_state.flush()
+    except Exception as e:
+        # The changes stay buffered for the next cycle; announcing late beats not announcing
+        logger.error(f"Failed to save live state: {e}")
+    if deliveries:
+        logger.info(f"Queued {len(deliveries)} go-live notification(s)")
+    return notification_dispatcher.submit_many(deliveries)
+
+async def check_youtube_channels(subscriptions, channels):
+    """Fetch each channel once and post only unseen uploads to every subscribed guild.
+
+    A guild's first sync of a channel records the current uploads as seen
+    without posting them. A channel with a guild not yet synced is fetched
+    in full, since a 304 would leave nothing to seed from. Channels whose
+    feed is unchanged or failed to fetch are skipped without touching
+    Discord.
+    """
+    logger.info(f"Checking YouTube releases for {len(channels)} channel(s)")
+    conditional = [all(seen_releases.is_seeded(guild_id, channel) for guild_id in subscriptions[channel]) for channel in channels]
+    fetched = await asyncio.gather(*(get_youtube_releases(channel, cond) for channel, cond in zip(channels, conditional)))
+    updated = [(channel, releases) for channel, releases in zip(channels, fetched) if releases]
+    if not updated:
+        # Nothing to record, so don't take the database write lock
+        return
+    youtube_posts = []
+    # Record everything seen this cycle in one transaction, before sending, so a crash can't repost
+    with tracing.span('youtube.mark_seen'), storage.db.transaction():
+        for youtube_channel, releases in updated:
+            for guild_id in subscriptions[youtube_channel]:
+                seeded = seen_releases.is_seeded(guild_id, youtube_channel)
+                new_ids = set(seen_releases.filter_new(guild_id, youtube_channel, [r['video_id'] for r in releases]))
+                if not new_ids:
+                    continue
+                seen_releases.mark_seen(guild_id, youtube_channel, list(new_ids))
+                if not seeded:
+                    logger.debug("Seeded %d existing upload(s) of %s for guild %s", len(new_ids), youtube_channel, guild_id)
+                    continue
+                youtube_channel_id, youtube_role_id = get_youtube_settings(guild_id)
+                if youtube_channel_id:
+                    new_releases = [r for r in releases if r['video_id'] in new_ids]
+                    youtube_posts.append(post_youtube_releases(youtube_channel_id, youtube_channel, youtube_role_id, new_releases))
+                else:
+                    logger.warning(f"No YouTube channel ID set for guild {guild_id}")
+    with tracing.span('youtube.post', posts=len(youtube_posts)):
+        results = await asyncio.gather(*youtube_posts, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error posting YouTube releases: {result}")
+
+async def handle_stream_event(login, online, started_at=None, stream_id=None):
+    """Apply an EventSub stream.online or stream.offline event.
+
+    The event goes through the same snapshot and notification path as a
+    poll result. stream.online carries no title or category, so those are
+    looked up from Helix, falling back to placeholders if the stream isn't
+    listed yet.
+    """
+    login = login.lower()
+    if remote_poller is not None:
+        # The worker polling this login owns its live state
+        remote_poller.stream_event(login, online, started_at, stream_id)
+        return
+    if not _owns(login):
+        # Another instance polls this login and owns its live state
+        logger.debug("Ignoring EventSub event for %s, its partition is polled elsewhere", login)
+        return
+    if online:
+        statuses = await check_streams_status(await get_oauth_token(), [login])
+        if not statuses.get(login):
+            statuses = {login: {
+                'id': stream_id,
+                'title': 'Live now',
+                'category': 'Unknown',
+                'started_at': started_at,
+                'url': f"https://www.twitch.tv/{login}"
+            }}
+    else:
+        statuses = {login: None}
+    live_status.publish(statuses)
+    guild_streamers = {guild_id: get_streamers(guild_id) for guild_id in get_all_guild_ids()}
+    await notify_twitch_statuses(guild_streamers, statuses)
+
+def set_eventsub_active(active):
+    """Switch Twitch polling between the normal interval and a slow reconciliation sweep.
+
+    While EventSub subscriptions are in place, go-live detection comes from
+    the webhook and polling only catches missed or late events. YouTube
+    channels keep the normal interval, EventSub doesn't cover them. With the
+    poll workload shared between instances, events for streamers another
+    instance polls are dropped, so polling stays at the normal interval.
+    """
+    if POLL_PARTITIONS:
+        active = False
+    if remote_poller is not None:
+        remote_poller.set_eventsub_active(active)
+        return
+    period = EVENTSUB_RECONCILE_INTERVAL if active else CHECK_INTERVAL
+    if poll_scheduler.kind_period('twitch') != period:
+        logger.info(f"EventSub {'active' if active else 'inactive'}, polling Twitch every {period} seconds")
+        poll_scheduler.set_kind_period('twitch', period)
+
+def set_poll_partitions(owned, count):
+    """Poll only the streamers and YouTube channels whose partition_of(key, count) is in owned.
+
+    Partitions new to this process may have been polled elsewhere until
+    now, so announced streams and seen uploads are re-read from the
+    database before they are polled here.
+    """
+    global poll_partitions
+    owned = frozenset(owned)
+    previous = poll_partitions
+    if previous is not None and (previous[1] != count or owned - previous[0]):
+        live_state.reload()
+        seen_releases.reset()
+    poll_partitions = (owned, count)
+
+def _owns(key):
+    return poll_partitions is None or partition_of(key, poll_partitions[1]) in poll_partitions[0]
+
+def set_poll_period(streamer, period):
+    """Poll one Twitch streamer every period seconds instead of CHECK_INTERVAL (None resets it)."""
+    poll_scheduler.set_period(('twitch', streamer.lower()), period)
+
+def _load_subscriptions():
+    """Return (guild_streamers, YouTube subscriptions), reading the database only after a guild's config changed."""
+    global _subscriptions
+    # Taken before loading, so a change committed meanwhile is picked up next time
+    version = storage.guild_cache.version
+    if _subscriptions is None or _subscriptions[0] != version:
+        guild_streamers = {guild_id: get_streamers(guild_id) for guild_id in get_all_guild_ids()}
+        _subscriptions = (version, guild_streamers, get_youtube_subscriptions())
+    return _subscriptions[1], _subscriptions[2]
+
+async def poll_cycle():
+    """Run whichever Twitch and YouTube checks are due; returns the (kind, key) pairs checked."""
+    # Pick up added and removed guilds and subscriptions first
+    with tracing.span('load_subscriptions'):
+        guild_streamers, youtube_subscriptions = _load_subscriptions()
+        tracked = {streamer.lower() for streamers in guild_streamers.values() for streamer in streamers}
+        all_streamers = {login for login in tracked if _owns(login)}
+        subscriptions = {channel: guild_ids for channel, guild_ids in youtube_subscriptions.items() if _owns(channel)}
+    with tracing.span('schedule'):
+        poll_scheduler.sync([('twitch', login) for login in all_streamers] +
+                            [('youtube', channel) for channel in subscriptions])
+        due = poll_scheduler.pop_due()
+    twitch_due = [key for kind, key in due if kind == 'twitch']
+    youtube_due = [key for kind, key in due if kind == 'youtube']
+
+    if twitch_due:
+        logger.info(f"Checking {len(twitch_due)} of {len(all_streamers)} streamer(s) across {len(guild_streamers)} guild(s)")
+        with tracing.span('token'):
+            access_token = await get_oauth_token()
+        statuses = await check_streams_status(access_token, twitch_due)
+        with tracing.span('publish'):
+            # Tracked by any instance, so live streams shared by other instances stay in the snapshot
+            snapshot = live_status.publish(statuses, tracked=tracked)
+        logger.info(f"Published live status snapshot v{snapshot.version}: {len(snapshot.streams)} live")
+        with tracing.span('notify'):
+            await notify_twitch_statuses(guild_streamers, statuses)
+
+    if youtube_due:
+        with tracing.span('youtube', channels=len(youtube_due)):
+            await check_youtube_channels(subscriptions, youtube_due)
+    return due
+
 async def monitor_streams():
-    global notified_streams
-    access_token = get_oauth_token()
     logger.info("Starting monitor_streams function")
     while True:
         try:
-            logger.info("Beginning stream check cycle")
-            for guild_id in notified_streams.keys():
-                streamers = get_streamers(guild_id)
-                logger.info(f"Checking streamers for guild {guild_id}: {streamers}")
-                for streamer in streamers:
-                    logger.info(f"Checking status for streamer: {streamer}")
-                    stream_info = check_stream_status(access_token, streamer)
-                    if stream_info and streamer not in notified_streams[guild_id]:
-                        logger.info(f"Streamer {streamer} is live. Attempting to send notification.")
-                        server_data = get_server_data(guild_id)
-                        channel_id = server_data.get('channel_id')
-                        role_id = server_data.get('role_id')
-                        if channel_id:
-                            message = f"🔴 {streamer} is now live on Twitch!\n\nTitle: {stream_info['title']}\nPlaying: {stream_info['category']}\nhttps://twitch.tv/{streamer}"
-                            logger.info(f"Sending message to channel {channel_id}: {message}")
-                            await send_discord_message(channel_id, message, role_id)
-                            notified_streams[guild_id].add(streamer)
-                        else:
-                            logger.warning(f"No channel_id found for guild {guild_id}")
-                    elif not stream_info and streamer in notified_streams[guild_id]:
-                        logger.info(f"Streamer {streamer} is no longer live. Removing from notified list.")
-                        notified_streams[guild_id].remove(streamer)
-
-                # Check YouTube releases
-                server_data = get_server_data(guild_id)
-                youtube_channel = server_data.get('youtube_channel')
-                if youtube_channel:
-                    youtube_channel_id, youtube_role_id = get_youtube_settings(guild_id)
-                    if youtube_channel_id:
-                        logger.info(f"Checking YouTube releases for channel: {youtube_channel}")
-                        await post_youtube_releases(youtube_channel_id, youtube_channel, youtube_role_id)
-                    else:
-                        logger.warning(f"No YouTube channel ID set for guild {guild_id}")
+            with tracing.trace_cycle('poll_cycle') as trace:
+                # Cycles with nothing due aren't worth a slot in the trace buffer
+                trace.keep = bool(await poll_cycle())
+            if trace.keep:
+                metrics.poll_cycle_seconds.observe(trace.duration)
         except Exception as e:
             logger.error(f"Error in monitor_streams: {e}")
 
-        logger.info(f"Stream check cycle complete. Sleeping for {CHECK_INTERVAL} seconds.")
-        await asyncio.sleep(CHECK_INTERVAL)
+        # Wake for the next due check, or after SCHEDULER_TICK to pick up new subscriptions
+        delay = poll_scheduler.time_until_next()
+        await asyncio.sleep(SCHEDULER_TICK if delay is None else min(delay, SCHEDULER_TICK))
 
 def get_current_streamer(guild_id):
-    streamers = get_streamers(guild_id)
-    access_token = get_oauth_token()
-    for streamer in streamers:
-        stream_info = check_stream_status(access_token, streamer)
-        if stream_info:
-            logger.info(f"Current live streamer for guild {guild_id}: {streamer}")
-            return streamer
-    logger.info(f"No live streamers found for guild {guild_id}")
-    return None
+    """Return the first of a guild's streamers that is live, from the poller's last snapshot."""
+    streamer = live_status.current_snapshot().first_live(get_streamers(guild_id))
+    if streamer:
+        logger.debug("Current live streamer for guild %s: %s", guild_id, streamer)
+    else:
+        logger.debug("No live streamers found for guild %s", guild_id)
+    return streamer
+
+def init_live_state():
+    """Load which streams were already announced, so a restart doesn't announce them again."""
+    count = live_state.load()
+    logger.info(f"Loaded {count} announced live stream(s)")
 
 if __name__ == "__main__":
-    # Initialize notified_streams for each guild
-    guild_ids = get_all_guild_ids()  # Retrieve all guild IDs from the database
-    for guild_id in guild_ids:
-        notified_streams[guild_id] = set()
+    from logging_setup import configure_logging
+    configure_logging()
+    setup_database()
+    init_live_state()
 
     # Start Twitch monitoring
     loop = asyncio.get_event_loop()
@@ -0,0 +1,78 @@
+"""Import-time budget for the headless entry point.
+
+Imports each module in a fresh interpreter several times and compares the
+median wall time with its budget. It also checks that the headless path
+(streamguard + bot) never loads Qt, Flask or bs4. Exits 1 if a budget is
+exceeded or a forbidden module was imported.
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --repeat 9 --scale 1.5   # slower machine
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds, measured from a warm disk cache; --scale adjusts them for slower machines
+IMPORT_BUDGETS = {
+    'storage': 0.15,
+    'app': 0.6,
+    'bot': 0.8,
+}
+FORBIDDEN_HEADLESS = ('PyQt6', 'flask', 'bs4', 'gui')
+
+MEASURE = '''
+import json, sys, time
+sys.path.insert(0, {repo!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'modules': sorted({{name.split('.')[0] for name in sys.modules}})}}))
+'''
+
+
+def measure(module, cwd):
+    completed = subprocess.run([sys.executable, '-c', MEASURE.format(repo=REPO_DIR, module=module)],
+                               cwd=cwd, capture_output=True, text=True,
+                               env={**os.environ, 'DB_PATH': os.path.join(cwd, 'import.db')})
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check StreamGuard's import times against their budgets")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget by this factor")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'module':<10} {'median s':>9} {'budget s':>9}")
+        for module, budget in IMPORT_BUDGETS.items():
+            runs = [measure(module, tmp) for _ in range(args.repeat)]
+            median = statistics.median(run['seconds'] for run in runs)
+            budget *= args.scale
+            print(f"{module:<10} {median:>9.3f} {budget:>9.3f}")
+            if median > budget:
+                failures.append(f"import {module} took {median:.3f}s, budget {budget:.3f}s")
+
+        loaded = set(measure('streamguard, bot', tmp)['modules'])
+        for name in FORBIDDEN_HEADLESS:
+            if name in loaded:
+                failures.append(f"headless import loaded {name}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("Import times within budget; headless path loads no Qt, Flask or bs4")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""Offline benchmark for the poll-and-notify cycle.
+
+Starts benchmarks/fake_services.py as a subprocess, then runs each scenario
+in a fresh interpreter, against its own SQLite file, with app.py pointed at
+the fake endpoints and the notification dispatcher sending through
+StubBot. Per scenario it reports:
+
+    cold_cycle_s   first poll_cycle(): every live stream is announced, feeds are seeded
+    warm_cycle_s   second poll_cycle(): nothing new, feeds answer 304
+    notify_p50_s / notify_p99_s
+                   time from the start of the cold cycle until each
+                   announcement reached the stub
+    helix_requests, youtube_requests
+                   requests the fake services saw over both cycles
+    peak_rss_kb    peak resident set size of the scenario's process
+
+Usage:
+
+    python benchmarks/bench_poll_cycle.py                   # default sweep
+    python benchmarks/bench_poll_cycle.py --full            # larger sweep
+    python benchmarks/bench_poll_cycle.py --save-baseline   # record baselines.json
+    python benchmarks/bench_poll_cycle.py --compare         # exit 1 on regressions
+
+Logging in the scenario process is raised to WARNING so output stays
+readable; INFO logging costs are therefore not included.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baselines.json')
+
+DEFAULT_SWEEP = {
+    'guilds': [10, 100, 500],
+    'streamers_per_guild': [10],
+    'overlap': [0.0, 0.8],
+    'live_ratio': [0.2],
+}
+FULL_SWEEP = {
+    'guilds': [10, 100, 500, 1000],
+    'streamers_per_guild': [5, 25],
+    'overlap': [0.0, 0.5, 0.9],
+    'live_ratio': [0.1, 0.5],
+}
+# Metrics checked by --compare; a regression must exceed both the relative and the absolute slack
+COMPARED_METRICS = ('cold_cycle_s', 'warm_cycle_s', 'notify_p99_s', 'helix_requests', 'youtube_requests')
+ABSOLUTE_SLACK = {'cold_cycle_s': 0.05, 'warm_cycle_s': 0.05, 'notify_p99_s': 0.1, 'helix_requests': 0, 'youtube_requests': 0}
+
+
+def scenario_key(scenario):
+    return (f"g{scenario['guilds']}-s{scenario['streamers_per_guild']}"
+            f"-o{scenario['overlap']}-l{scenario['live_ratio']}")
+
+
+def build_subscriptions(guilds, streamers_per_guild, overlap, youtube_per_guild):
+    """Return {guild_id: (streamers, youtube handles)}; `overlap` of each list comes from a shared pool."""
+    shared = round(streamers_per_guild * overlap)
+    shared_youtube = round(youtube_per_guild * overlap)
+    subscriptions = {}
+    for g in range(guilds):
+        streamers = [f"popular{i}" for i in range(shared)]
+        streamers += [f"g{g}streamer{i}" for i in range(streamers_per_guild - shared)]
+        youtubers = [f"popularchannel{i}" for i in range(shared_youtube)]
+        youtubers += [f"g{g}channel{i}" for i in range(youtube_per_guild - shared_youtube)]
+        subscriptions[str(900000 + g)] = (streamers, youtubers)
+    return subscriptions
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def _run_cycles(scenario):
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    import app
+    import storage
+    from notifier import NotificationDispatcher
+    from scheduler import PollScheduler
+    from stub_bot import StubBot
+
+    storage.setup_database()
+    subscriptions = build_subscriptions(scenario['guilds'], scenario['streamers_per_guild'],
+                                        scenario['overlap'], scenario['youtube_per_guild'])
+    with storage.db.transaction():
+        for n, (guild_id, (streamers, youtubers)) in enumerate(subscriptions.items()):
+            storage.set_server_data(guild_id, channel_id=10 ** 6 + n, youtube_channel_id=2 * 10 ** 6 + n)
+            for streamer in streamers:
+                storage.add_streamer(guild_id, streamer)
+            for handle in youtubers:
+                storage.add_youtuber(guild_id, handle)
+
+    # A fake clock one period ahead per cycle, with a batch window of a whole period, makes every key due each cycle
+    clock = [0.0]
+    app.poll_scheduler = PollScheduler(app.CHECK_INTERVAL, jitter=0, batch_window=app.CHECK_INTERVAL,
+                                      clock=lambda: clock[0])
+    stub = StubBot(latency=scenario['discord_latency'])
+    app.notification_dispatcher = NotificationDispatcher(client=stub)
+
+    start = time.perf_counter()
+    await app.poll_cycle()
+    cold_cycle = time.perf_counter() - start
+    await app.notification_dispatcher.drain()
+    latencies = [sent_at - start for _, sent_at, _ in stub.sent]
+
+    clock[0] += app.CHECK_INTERVAL
+    warm_start = time.perf_counter()
+    await app.poll_cycle()
+    warm_cycle = time.perf_counter() - warm_start
+    await app.notification_dispatcher.drain()
+    await app.http_session.close()
+
+    import resource
+    return {
+        'cold_cycle_s': round(cold_cycle, 4),
+        'warm_cycle_s': round(warm_cycle, 4),
+        'notifications': len(latencies),
+        'notify_p50_s': round(percentile(latencies, 0.5) or 0.0, 4),
+        'notify_p99_s': round(percentile(latencies, 0.99) or 0.0, 4),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_scenario_here(scenario):
+    """Entry point of the scenario subprocess; prints the result as the last line of stdout."""
+    sys.path[:0] = [REPO_DIR, BENCH_DIR]
+    result = asyncio.run(_run_cycles(scenario))
+    print(json.dumps(result))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _http_json(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'},
+                                 method='POST' if data is not None else 'GET')
+    with urllib.request.urlopen(req, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def start_fake_services(port):
+    process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'fake_services.py'), '--port', str(port)])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            _http_json(f"http://127.0.0.1:{port}/_stats")
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Fake services did not start")
+
+
+def run_scenario(scenario, base_url, args):
+    _http_json(f"{base_url}/_config", {
+        'latency': args.helix_latency,
+        'rate_limit': args.rate_limit,
+        'live_ratio': scenario['live_ratio'],
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            'DB_PATH': os.path.join(tmp, 'bench.db'),
+            'CLIENT_ID': 'bench',
+            'CLIENT_SECRET': 'bench',
+            'TWITCH_API_URL': f"{base_url}/helix/streams",
+            'TWITCH_TOKEN_URL': f"{base_url}/oauth2/token",
+            'YOUTUBE_BASE_URL': base_url,
+        }
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-scenario', json.dumps(scenario)],
+                                   env=env, cwd=tmp, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Scenario {scenario_key(scenario)} failed:\n{completed.stderr}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    stats = _http_json(f"{base_url}/_stats")
+    result['helix_requests'] = stats.get('helix', 0)
+    result['helix_429s'] = stats.get('helix_429', 0)
+    result['youtube_requests'] = stats.get('youtube_feed', 0) + stats.get('youtube_page', 0)
+    return result
+
+
+def compare(results, baselines, tolerance):
+    """Return a list of human-readable regressions against the saved baselines."""
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in baseline:
+                continue
+            limit = max(baseline[metric] * (1 + tolerance), baseline[metric] + ABSOLUTE_SLACK[metric])
+            if result[metric] > limit:
+                regressions.append(f"{key} {metric}: {result[metric]} > {baseline[metric]} (limit {limit:.4g})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark StreamGuard's poll-and-notify cycle against local fakes")
+    parser.add_argument('--full', action='store_true', help="Run the larger sweep")
+    parser.add_argument('--guilds', type=int, nargs='+')
+    parser.add_argument('--streamers-per-guild', type=int, nargs='+')
+    parser.add_argument('--overlap', type=float, nargs='+')
+    parser.add_argument('--live-ratio', type=float, nargs='+')
+    parser.add_argument('--youtube-per-guild', type=int, default=2)
+    parser.add_argument('--helix-latency', type=float, default=0.02, help="Seconds per fake Helix/YouTube response")
+    parser.add_argument('--rate-limit', type=int, default=800, help="Fake Helix points per minute")
+    parser.add_argument('--discord-latency', type=float, default=0.05, help="Seconds per stub Discord send")
+    parser.add_argument('--baseline-file', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Relative slack allowed by --compare")
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        run_scenario_here(json.loads(args.run_scenario))
+        return 0
+
+    sweep = dict(FULL_SWEEP if args.full else DEFAULT_SWEEP)
+    for name in sweep:
+        if getattr(args, name):
+            sweep[name] = getattr(args, name)
+    scenarios = [dict(zip(sweep, values), youtube_per_guild=args.youtube_per_guild, discord_latency=args.discord_latency)
+                 for values in itertools.product(*sweep.values())]
+
+    port = _free_port()
+    services = start_fake_services(port)
+    results = {}
+    try:
+        print(f"{'scenario':<24} {'cold s':>8} {'warm s':>8} {'p50 s':>8} {'p99 s':>8} {'notifs':>7} {'helix':>6} {'yt':>6} {'rss MB':>7}")
+        for scenario in scenarios:
+            key = scenario_key(scenario)
+            result = results[key] = run_scenario(scenario, f"http://127.0.0.1:{port}", args)
+            print(f"{key:<24} {result['cold_cycle_s']:>8.3f} {result['warm_cycle_s']:>8.3f} "
+                  f"{result['notify_p50_s']:>8.3f} {result['notify_p99_s']:>8.3f} {result['notifications']:>7} "
+                  f"{result['helix_requests']:>6} {result['youtube_requests']:>6} {result['peak_rss_kb'] / 1024:>7.1f}")
+    finally:
+        services.terminate()
+        services.wait()
+
+    status = 0
+    if args.compare:
+        with open(args.baseline_file, encoding='utf-8') as f:
+            baselines = json.load(f).get('scenarios', {})
+        regressions = compare(results, baselines, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            status = 1
+        else:
+            print(f"No regressions against {args.baseline_file}")
+    if args.save_baseline:
+        data = {}
+        if os.path.exists(args.baseline_file):
+            with open(args.baseline_file, encoding='utf-8') as f:
+                data = json.load(f)
+        data.setdefault('scenarios', {}).update(results)
+        data['settings'] = {
+            'helix_latency': args.helix_latency,
+            'rate_limit': args.rate_limit,
+            'discord_latency': args.discord_latency,
+            'youtube_per_guild': args.youtube_per_guild,
+        }
+        with open(args.baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved {len(results)} baseline(s) to {args.baseline_file}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
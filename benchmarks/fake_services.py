@@ -0,0 +1,148 @@
+"""Local stand-ins for the Twitch and YouTube endpoints the poller talks to.
+
+One aiohttp server answers:
+
+    POST /oauth2/token          Twitch app token
+    GET  /helix/streams         Helix streams, with Ratelimit-* headers and 429s
+    GET  /@<handle>             YouTube channel page naming the channel id
+    GET  /feeds/videos.xml      YouTube Atom feed, with ETag / 304 support
+    POST /_config               Set latency, rate limit and live ratio; resets stats
+    GET  /_stats                Request counts since the last /_config
+
+Which logins are live is a deterministic function of the login and the live
+ratio, so runs are repeatable. Run standalone with:
+
+    python benchmarks/fake_services.py --port 8765
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+from collections import Counter
+
+from aiohttp import web
+
+DEFAULT_CONFIG = {
+    'latency': 0.02,  # Seconds added to every response
+    'rate_limit': 800,  # Helix points per minute
+    'live_ratio': 0.2,  # Fraction of logins reported live
+    'feed_entries': 15,
+}
+
+
+def _fraction(value):
+    return int(hashlib.sha1(value.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+def channel_id_for(handle):
+    return 'UC' + hashlib.sha1(handle.encode()).hexdigest()[:22]
+
+
+def is_live(login, live_ratio):
+    return _fraction(login) < live_ratio
+
+
+class FakeServices:
+    def __init__(self, **config):
+        self.config = {**DEFAULT_CONFIG, **config}
+        self.stats = Counter()
+        self._window_start = time.monotonic()
+        self._points_used = 0
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/oauth2/token', self.token)
+        app.router.add_get('/helix/streams', self.streams)
+        app.router.add_get('/feeds/videos.xml', self.feed)
+        app.router.add_get('/_stats', self.get_stats)
+        app.router.add_post('/_config', self.set_config)
+        app.router.add_get('/{handle:@[^/]+}', self.channel_page)
+        return app
+
+    async def _delay(self):
+        if self.config['latency']:
+            await asyncio.sleep(self.config['latency'])
+
+    def _rate_limit_headers(self):
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start, self._points_used = now, 0
+        limit = self.config['rate_limit']
+        reset = int(time.time() + 60 - (now - self._window_start))
+        return limit, {
+            'Ratelimit-Limit': str(limit),
+            'Ratelimit-Remaining': str(max(limit - self._points_used, 0)),
+            'Ratelimit-Reset': str(reset),
+        }
+
+    async def token(self, request):
+        self.stats['token'] += 1
+        await self._delay()
+        return web.json_response({'access_token': 'fake-token', 'expires_in': 3600, 'token_type': 'bearer'})
+
+    async def streams(self, request):
+        self.stats['helix'] += 1
+        await self._delay()
+        limit, headers = self._rate_limit_headers()
+        if self._points_used >= limit:
+            self.stats['helix_429'] += 1
+            headers['Ratelimit-Remaining'] = '0'
+            return web.json_response({'error': 'Too Many Requests', 'status': 429}, status=429, headers=headers)
+        self._points_used += 1
+        headers['Ratelimit-Remaining'] = str(limit - self._points_used)
+        logins = request.query.getall('user_login', [])
+        data = [{
+            'id': str(int(_fraction(login) * 10 ** 9)),
+            'user_login': login,
+            'user_name': login,
+            'title': f"{login} stream",
+            'game_name': 'Just Chatting',
+            'started_at': '2024-01-01T00:00:00Z',
+        } for login in logins if is_live(login, self.config['live_ratio'])]
+        return web.json_response({'data': data, 'pagination': {}}, headers=headers)
+
+    async def channel_page(self, request):
+        self.stats['youtube_page'] += 1
+        await self._delay()
+        handle = request.match_info['handle'][1:]
+        return web.Response(text=f'<html><script>{{"externalId":"{channel_id_for(handle)}"}}</script></html>',
+                            content_type='text/html')
+
+    async def feed(self, request):
+        self.stats['youtube_feed'] += 1
+        await self._delay()
+        channel_id = request.query.get('channel_id', '')
+        etag = f'"{channel_id}"'
+        if request.headers.get('If-None-Match') == etag:
+            self.stats['youtube_304'] += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        entries = ''.join(
+            f'<entry><yt:videoId>{channel_id[2:13]}{i:03d}</yt:videoId><title>Video {i}</title>'
+            f'<published>2024-01-01T00:00:00+00:00</published></entry>'
+            for i in range(self.config['feed_entries'])
+        )
+        body = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">'
+                f'{entries}</feed>')
+        return web.Response(text=body, content_type='application/atom+xml', headers={'ETag': etag})
+
+    async def get_stats(self, request):
+        return web.json_response(dict(self.stats))
+
+    async def set_config(self, request):
+        self.config.update(await request.json())
+        self.stats.clear()
+        self._window_start, self._points_used = time.monotonic(), 0
+        return web.json_response(self.config)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Twitch and YouTube endpoints for benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=DEFAULT_CONFIG['latency'])
+    parser.add_argument('--rate-limit', type=int, default=DEFAULT_CONFIG['rate_limit'])
+    parser.add_argument('--live-ratio', type=float, default=DEFAULT_CONFIG['live_ratio'])
+    args = parser.parse_args()
+    services = FakeServices(latency=args.latency, rate_limit=args.rate_limit, live_ratio=args.live_ratio)
+    web.run_app(services.app(), host=args.host, port=args.port, print=None)
@@ -0,0 +1,32 @@
+"""A stand-in for the discord.py bot that the notification dispatcher sends through."""
+import asyncio
+import time
+
+
+class StubChannel:
+    def __init__(self, bot, channel_id):
+        self.bot = bot
+        self.id = channel_id
+
+    async def send(self, content=None, **kwargs):
+        if self.bot.latency:
+            await asyncio.sleep(self.bot.latency)
+        self.bot.sent.append((self.id, time.perf_counter(), content))
+
+
+class StubBot:
+    """Records every message with the time it was "delivered", after a fixed per-send latency."""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.sent = []
+        self.guilds = []
+
+    def get_partial_messageable(self, channel_id, **kwargs):
+        return StubChannel(self, channel_id)
+
+    def get_channel(self, channel_id):
+        return StubChannel(self, channel_id)
+
+    async def fetch_channel(self, channel_id):
+        return StubChannel(self, channel_id)
@@ -6,24 +6,36 @@ import logging
 import discord
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
-from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QTimer
-from PyQt6.QtCore import QObject, pyqtSignal
-from gui import StreamGuardGUI
-from flask import Flask
-from app import get_current_streamer
-from storage import get_server_data, set_server_data, get_streamers, get_all_guild_ids
-
-class BotSignals(QObject):
-    update_servers = pyqtSignal()
-
-bot_signals = BotSignals()
+import metrics
+import tracing
+from logging_setup import configure_logging
+from log_forwarder import LogForwarder
+from log_channels import LogChannelResolver
+from eventsub import create_blueprint, attach_loop, eventsub_enabled, subscription_manager
+import app
+from app import get_current_streamer, init_live_state, monitor_streams
+from worker import POLL_WORKERS, PollerSupervisor
+from shards import POLL_PARTITIONS, LeaseCoordinator
+import storage
+from storage import get_streamers, get_all_guild_ids, setup_database
+
+# Qt and Flask are imported only by the code paths that use them, so the
+# headless server never loads Qt and importing bot stays cheap.
+bot_signals = None  # Set by main() when running with the GUI
+
+def create_bot_signals():
+    from PyQt6.QtCore import QObject, pyqtSignal
+
+    class BotSignals(QObject):
+        update_servers = pyqtSignal()
+        server_added = pyqtSignal(str, str)  # guild id, name; also used for renames
+        server_removed = pyqtSignal(str)
+
+    return BotSignals()
 
 # Load environment variables
 load_dotenv()
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize Discord bot
@@ -31,22 +43,82 @@ DISCORD_BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
 intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix='!', intents=intents)
+log_forwarder = LogForwarder()
+
+# Guild and category that hold one mirror channel per server the bot is in
+LOG_GUILD_ID = 1295227199418269777
+LOG_CATEGORY_ID = 1318845660891451392
+log_channels = LogChannelResolver(bot, LOG_GUILD_ID, LOG_CATEGORY_ID)
+
+metrics.queue_depth.labels('log_forwarder').set_function(lambda: sum(log_forwarder.queue_depths().values()))
+
+def create_flask_app():
+    from flask import Flask, Response, jsonify
+
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(create_blueprint())
+
+    @flask_app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+    @flask_app.route('/debug/traces')
+    def traces_endpoint():
+        # Only served with the STREAMGUARD_DEBUG switch on
+        if not tracing.DEBUG_ENABLED:
+            return Response(status=404)
+        return jsonify([trace.to_dict() for trace in tracing.recent_traces()])
 
-# Initialize Flask app
-flask_app = Flask(__name__)
+    return flask_app
 
 @bot.event
 async def on_ready():
     print(f'We have logged in as {bot.user}')
-    update_status.start()
-    heartbeat.start()
+    log_channels.index()
+    # on_ready fires again after reconnects, only start the background tasks once
+    if getattr(bot, 'poller_task', None) is None:
+        start_poller()
+        attach_loop(bot.loop)
+        if eventsub_enabled():
+            bot.eventsub_task = bot.loop.create_task(subscription_manager.run())
+    if not update_status.is_running():
+        update_status.start()
+    if not heartbeat.is_running():
+        heartbeat.start()
     if hasattr(bot, 'gui'):
         bot_signals.update_servers.emit()
         
+def start_poller():
+    """Start polling on this loop or in worker processes, over the partitions this instance leases if sharded."""
+    # Passed in rather than imported: run as a script, this module is __main__, and importing bot would build a second Bot
+    app.notification_dispatcher.client = bot
+    if POLL_WORKERS > 0:
+        # Keep polling off the gateway's loop and GIL
+        poller = app.remote_poller = PollerSupervisor(POLL_WORKERS)
+        set_partitions = poller.set_partitions
+
+        def reload_guild(guild_id):
+            storage.reload_guild(guild_id)
+            poller.guild_changed(guild_id)
+        bot.poller_task = bot.loop.create_task(poller.run())
+    else:
+        init_live_state()
+        set_partitions = app.set_poll_partitions
+        reload_guild = storage.reload_guild
+        bot.poller_task = bot.loop.create_task(monitor_streams())
+    if POLL_PARTITIONS > 0:
+        # Poll nothing until the first heartbeat has taken this instance's leases
+        set_partitions(frozenset(), POLL_PARTITIONS)
+        bot.shard_task = bot.loop.create_task(LeaseCoordinator(set_partitions, reload_guild).run())
+
 @bot.event
 async def on_message(message):
     if message.author == bot.user:
         return
+    with metrics.on_message_seconds.time():
+        await handle_message(message)
+
+async def handle_message(message):
 
     if isinstance(message.channel, discord.TextChannel):
         guild_name = message.guild.name
@@ -60,41 +132,16 @@ async def on_message(message):
         else:
             permission_type = "Regular User"
 
-        print(f"Server Message: {message.content} | Server Name: {guild_name} (ID: {guild_id}) | User: {message.author} | Permissions: {permission_type}")
-
-        target_guild_id = 1295227199418269777
-        category_id = 1318845660891451392
-
-        target_guild = bot.get_guild(target_guild_id)
-        if target_guild is None:
-            print(f"[ ERROR ] Target guild with ID {target_guild_id} not found.")
-            return
-
-        category = discord.utils.get(target_guild.categories, id=category_id)
-        if category is None:
-            print(f"[ ERROR ] Category with ID {category_id} not found in target guild {target_guild.name} (ID: {target_guild.id})")
-            return
-
-        server_data = get_server_data(message.guild.id)
-        log_channel_id = server_data.get('log_channel_id')
+        logger.debug("Server Message: %s | Server Name: %s (ID: %s) | User: %s | Permissions: %s",
+                     message.content, guild_name, guild_id, message.author, permission_type)
 
-        log_channel = None
-        if log_channel_id:
-            log_channel = bot.get_channel(log_channel_id)
-
-        if not log_channel:
-            log_channel_name = f"log-{message.guild.name.lower().replace(' ', '-')}"
-            log_channel = discord.utils.get(target_guild.text_channels, name=log_channel_name)
-
-            if not log_channel:
-                try:
-                    log_channel = await target_guild.create_text_channel(log_channel_name, category=category)
-                    print(f"[ INFO ] Created new log channel: {log_channel.name} in target guild {target_guild.name} (ID: {target_guild.id})")
-                except Exception as e:
-                    print(f"[ ERROR ] Failed to create log channel: {e}")
-                    return
-
-            set_server_data(message.guild.id, log_channel_id=log_channel.id)
+        # O(1) after the first message from a guild; creation is single-flight per guild
+        log_channel = log_channels.get(guild_id)
+        if log_channel is None:
+            log_channel = await log_channels.resolve(message.guild)
+            if log_channel is None:
+                logger.error(f"No log channel available for guild {guild_name} (ID: {guild_id})")
+                return
 
         try:
             embed = discord.Embed(
@@ -108,14 +155,15 @@ async def on_message(message):
             embed.add_field(name="Channel", value=message.channel.name, inline=True)
             embed.set_footer(text=f"Message sent at {message.created_at.strftime('%Y-%m-%d %H:%M:%S')} UTC")
 
-            await log_channel.send(embed=embed)
+            # Sent in batches by the forwarder, so the handler doesn't wait on Discord
+            log_forwarder.enqueue(log_channel, embed)
         except Exception as e:
-            print(f"[ ERROR ] Failed to send message to log channel: {e}")
+            logger.error(f"Failed to queue message for log channel: {e}")
 
     else:
-        print(f"Direct Message: {message.content} | From User: {message.author}")
+        logger.debug("Direct Message: %s | From User: %s", message.content, message.author)
 
-        target_guild_id = 1295227199418269777
+        target_guild_id = LOG_GUILD_ID
         log_channel_id = 1318850799987593267
 
         target_guild = bot.get_guild(target_guild_id)
@@ -131,35 +179,58 @@ async def on_message(message):
                     embed.set_author(name=str(message.author), icon_url=message.author.avatar.url if message.author.avatar else None)
                     embed.set_footer(text=f"Message sent at {message.created_at.strftime('%Y-%m-%d %H:%M:%S')} UTC")
 
-                    await log_channel.send(embed=embed)
+                    log_forwarder.enqueue(log_channel, embed)
                 except Exception as e:
-                    print(f"[ ERROR ] Failed to send direct message to log channel: {e}")
+                    logger.error(f"Failed to queue direct message for log channel: {e}")
             else:
-                print(f"[ ERROR ] Log channel with ID {log_channel_id} not found in target guild.")
+                logger.error(f"Log channel with ID {log_channel_id} not found in target guild.")
         else:
-            print(f"[ ERROR ] Target guild with ID {target_guild_id} not found.")
+            logger.error(f"Target guild with ID {target_guild_id} not found.")
 
     await bot.process_commands(message)
 
+@bot.event
+async def on_guild_channel_create(channel):
+    log_channels.channel_created(channel)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    log_channels.channel_deleted(channel)
+
+@bot.event
+async def on_guild_join(guild):
+    if hasattr(bot, 'gui'):
+        bot_signals.server_added.emit(str(guild.id), guild.name)
+
+@bot.event
+async def on_guild_remove(guild):
+    if hasattr(bot, 'gui'):
+        bot_signals.server_removed.emit(str(guild.id))
+
 @bot.event
 async def on_guild_update(before, after):
-    if before.name != after.name:
-        pass
+    if before.name != after.name and hasattr(bot, 'gui'):
+        bot_signals.server_added.emit(str(after.id), after.name)
 
 @tasks.loop(minutes=1)
 async def update_status():
     try:
+        # Live status comes from the poller's snapshot, no Twitch calls here
         for guild in bot.guilds:
             streamer = get_current_streamer(guild.id)
             if streamer:
-                activity = discord.Activity(name=f"{streamer} on Twitch", type=discord.ActivityType.watching)
-                await bot.change_presence(activity=activity, status=discord.Status.online)
-                logger.info(f"Updated bot status: Watching {streamer} on Twitch")
+                if getattr(bot, 'presence_name', None) != streamer:
+                    activity = discord.Activity(name=f"{streamer} on Twitch", type=discord.ActivityType.watching)
+                    await bot.change_presence(activity=activity, status=discord.Status.online)
+                    bot.presence_name = streamer
+                    logger.info(f"Updated bot status: Watching {streamer} on Twitch")
                 return  # Exit after finding the first live streamer
 
         # If no streamers are live, set a default status
-        await bot.change_presence(activity=discord.Activity(name="You", type=discord.ActivityType.watching))
-        logger.info("Updated bot status: Watching You")
+        if getattr(bot, 'presence_name', '') is not None:
+            await bot.change_presence(activity=discord.Activity(name="You", type=discord.ActivityType.watching))
+            bot.presence_name = None
+            logger.info("Updated bot status: Watching You")
     except Exception as e:
         logger.error(f"Error updating bot status: {e}")
 
@@ -176,16 +247,33 @@ def get_server_names():
 
 def run_flask_app():
     port = int(os.environ.get("PORT", 5000))
-    flask_app.run(host="0.0.0.0", port=port)
+    create_flask_app().run(host="0.0.0.0", port=port)
 
 @tasks.loop(minutes=1)
 async def heartbeat():
     print("[ INFO ] Bot is still running.")
 
 def run_bot():
-    bot.run(DISCORD_BOT_TOKEN)
+    # discord.py's default handler would write discord.* records on the gateway thread, and twice
+    bot.run(DISCORD_BOT_TOKEN, log_handler=None)
+
+def serve():
+    """Run the bot, poller and web endpoints without the GUI."""
+    configure_logging()
+    setup_database()
+    flask_thread = threading.Thread(target=run_flask_app, daemon=True)
+    flask_thread.start()
+    run_bot()
 
 def main():
+    global bot_signals
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QTimer
+    from gui import StreamGuardGUI
+
+    configure_logging()
+    setup_database()
+    bot_signals = create_bot_signals()
     app = QApplication(sys.argv)
 
     main_window = StreamGuardGUI()
@@ -194,6 +282,8 @@ def main():
     
     # Connect the signal to the GUI method
     bot_signals.update_servers.connect(main_window.update_servers_list)
+    bot_signals.server_added.connect(main_window.add_server)
+    bot_signals.server_removed.connect(main_window.remove_server)
     
     # Pass the GUI instance to the bot
     bot.gui = main_window
@@ -1,5 +1,6 @@
 import discord
 from discord.ext import commands
+from live_status import current_snapshot
 from storage import get_server_data, set_server_data, add_streamer, remove_streamer, get_streamers, get_youtubers, add_youtuber, remove_youtuber
 
 
@@ -163,6 +164,8 @@ class BotCommands(commands.Cog):
             if action == "list":
                 streamers = get_streamers(guild_id)
                 if streamers:
+                    snapshot = current_snapshot()
+                    streamers = [f"{s} 🔴" if snapshot.is_live(s) else s for s in streamers]
                     await ctx.send(f"📋 Current Twitch streamers: {', '.join(streamers)}")
                 else:
                     await ctx.send("📋 No Twitch streamers in the list.")
@@ -205,8 +208,10 @@ class BotCommands(commands.Cog):
                     return
 
                 if action == "add":
-                    add_youtuber(ctx.guild.id, channel_name)
-                    await ctx.send(f"✅ Added YouTube channel '{channel_name}' to the monitoring list.")
+                    if add_youtuber(ctx.guild.id, channel_name):
+                        await ctx.send(f"✅ Added YouTube channel '{channel_name}' to the monitoring list.")
+                    else:
+                        await ctx.send(f"❌ YouTube channel '{channel_name}' is already in the monitoring list.")
                 else:  # remove
                     if remove_youtuber(ctx.guild.id, channel_name):
                         await ctx.send(f"✅ Removed YouTube channel '{channel_name}' from the monitoring list.")
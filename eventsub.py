@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+EVENTSUB_CALLBACK_URL = os.getenv('EVENTSUB_CALLBACK_URL')  # Public https URL routed to /eventsub
+EVENTSUB_SECRET = os.getenv('EVENTSUB_SECRET')  # 10-100 characters, shared with Twitch
+EVENTSUB_SUBSCRIPTIONS_URL = "https://api.twitch.tv/helix/eventsub/subscriptions"
+TWITCH_USERS_URL = "https://api.twitch.tv/helix/users"
+EVENTSUB_TYPES = ('stream.online', 'stream.offline')
+EVENTSUB_SYNC_INTERVAL = 120  # Seconds between subscription syncs with the streamers table
+MAX_MESSAGE_AGE = 600  # Twitch recommends rejecting messages older than 10 minutes
+SEEN_MESSAGE_IDS = 10000
+
+_loop = None
+
+
+def eventsub_enabled():
+    return bool(EVENTSUB_CALLBACK_URL and EVENTSUB_SECRET)
+
+
+def attach_loop(loop):
+    """Deliver webhook events to coroutines on this event loop (the bot's)."""
+    global _loop
+    _loop = loop
+
+
+def sign_message(secret, message_id, timestamp, body):
+    """Compute the Twitch-Eventsub-Message-Signature value for a message."""
+    digest = hmac.new(secret.encode(), message_id.encode() + timestamp.encode() + body, hashlib.sha256)
+    return f"sha256={digest.hexdigest()}"
+
+
+def verify_signature(secret, message_id, timestamp, body, signature):
+    if not (secret and message_id and timestamp and signature):
+        return False
+    return hmac.compare_digest(sign_message(secret, message_id, timestamp, body), signature)
+
+
+def _parse_timestamp(timestamp):
+    # Twitch sends RFC 3339 with nanoseconds; trim to what fromisoformat accepts
+    value = timestamp.rstrip('Z')
+    if '.' in value:
+        head, fraction = value.split('.', 1)
+        value = f"{head}.{fraction[:6]}"
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+class MessageIdCache:
+    """Remembers recent EventSub message ids so retried deliveries are ignored."""
+
+    def __init__(self, maxsize=SEEN_MESSAGE_IDS, ttl=MAX_MESSAGE_AGE):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check_and_add(self, message_id):
+        """Return True if the id is new, and remember it."""
+        now = time.monotonic()
+        with self._lock:
+            while self._seen and (len(self._seen) >= self.maxsize or next(iter(self._seen.values())) < now - self.ttl):
+                self._seen.popitem(last=False)
+            if message_id in self._seen:
+                return False
+            self._seen[message_id] = now
+            return True
+
+    def forget(self, message_id):
+        """Forget an id whose message wasn't processed, so Twitch's retry is accepted."""
+        with self._lock:
+            self._seen.pop(message_id, None)
+
+
+seen_messages = MessageIdCache()
+
+
+def create_blueprint():
+    """Build the Flask blueprint serving POST /eventsub. Flask is only imported here."""
+    from flask import Blueprint
+    blueprint = Blueprint('eventsub', __name__)
+    blueprint.add_url_rule('/eventsub', view_func=eventsub_callback, methods=['POST'])
+    return blueprint
+
+
+def eventsub_callback():
+    from flask import Response, request
+    body = request.get_data()
+    message_id = request.headers.get('Twitch-Eventsub-Message-Id')
+    timestamp = request.headers.get('Twitch-Eventsub-Message-Timestamp')
+    signature = request.headers.get('Twitch-Eventsub-Message-Signature')
+    message_type = request.headers.get('Twitch-Eventsub-Message-Type')
+
+    if not verify_signature(EVENTSUB_SECRET, message_id, timestamp, body, signature):
+        logger.warning(f"Rejected EventSub message {message_id}: bad signature")
+        return Response(status=403)
+    try:
+        age = (datetime.now(timezone.utc) - _parse_timestamp(timestamp)).total_seconds()
+    except ValueError:
+        return Response(status=400)
+    if age > MAX_MESSAGE_AGE:
+        logger.warning(f"Rejected EventSub message {message_id}: {int(age)}s old")
+        return Response(status=403)
+    if not seen_messages.check_and_add(message_id):
+        logger.debug("Ignoring duplicate EventSub message %s", message_id)
+        return Response(status=204)
+
+    payload = json.loads(body)
+    subscription = payload.get('subscription', {})
+    if message_type == 'webhook_callback_verification':
+        logger.info(f"Verified EventSub subscription {subscription.get('id')} ({subscription.get('type')})")
+        return Response(payload['challenge'], status=200, mimetype='text/plain')
+    if message_type == 'revocation':
+        logger.warning(f"EventSub subscription {subscription.get('id')} revoked: {subscription.get('status')}")
+        subscription_manager.request_sync()
+        return Response(status=204)
+    if message_type != 'notification':
+        return Response(status=204)
+
+    event = payload.get('event', {})
+    login = event.get('broadcaster_user_login')
+    if subscription.get('type') not in EVENTSUB_TYPES or not login:
+        return Response(status=204)
+    if _loop is None or _loop.is_closed():
+        # Let Twitch retry once the bot is connected
+        logger.warning(f"Dropping EventSub {subscription.get('type')} for {login}: bot loop not running")
+        seen_messages.forget(message_id)
+        return Response(status=503)
+
+    from app import handle_stream_event
+    online = subscription['type'] == 'stream.online'
+    logger.info(f"EventSub {subscription['type']} for {login}")
+    future = asyncio.run_coroutine_threadsafe(handle_stream_event(login, online, event.get('started_at'), event.get('id')), _loop)
+    future.add_done_callback(lambda future: _log_event_error(future, login))
+    return Response(status=204)
+
+
+def _log_event_error(future, login):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Error handling EventSub event for {login}: {future.exception()}")
+
+
+class EventSubManager:
+    """Keeps stream.online/stream.offline subscriptions in sync with the streamers table."""
+
+    def __init__(self, callback_url=EVENTSUB_CALLBACK_URL, secret=EVENTSUB_SECRET):
+        self.callback_url = callback_url
+        self.secret = secret
+        self.user_ids = {}  # login -> broadcaster user id
+        self._wakeup = None
+
+    def request_sync(self):
+        """Ask the running sync loop to resync now, e.g. after a revocation."""
+        if self._wakeup is not None and _loop is not None:
+            _loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def resolve_user_ids(self, logins):
+        from app import helix_request, TWITCH_BATCH_SIZE
+        missing = sorted({login.lower() for login in logins} - set(self.user_ids))
+        for start in range(0, len(missing), TWITCH_BATCH_SIZE):
+            chunk = missing[start:start + TWITCH_BATCH_SIZE]
+            response = await helix_request('GET', TWITCH_USERS_URL, params=[('login', login) for login in chunk])
+            for user in response.json()['data']:
+                self.user_ids[user['login'].lower()] = user['id']
+        return {login.lower(): self.user_ids[login.lower()] for login in logins if login.lower() in self.user_ids}
+
+    async def list_subscriptions(self):
+        """Return our webhook subscriptions keyed by (type, broadcaster_user_id)."""
+        from app import helix_request
+        subscriptions = {}
+        cursor = None
+        while True:
+            params = {'after': cursor} if cursor else {}
+            data = (await helix_request('GET', EVENTSUB_SUBSCRIPTIONS_URL, params=params)).json()
+            for sub in data['data']:
+                if sub['type'] in EVENTSUB_TYPES and sub['transport'].get('callback') == self.callback_url:
+                    subscriptions[(sub['type'], sub['condition']['broadcaster_user_id'])] = sub
+            cursor = data.get('pagination', {}).get('cursor')
+            if not cursor:
+                return subscriptions
+
+    async def sync(self):
+        """Create missing subscriptions and delete ones for untracked or failed streamers."""
+        from app import helix_request
+        from storage import get_tracked_streamers
+        wanted_ids = set((await self.resolve_user_ids(get_tracked_streamers())).values())
+        existing = await self.list_subscriptions()
+        created = deleted = 0
+        for (sub_type, user_id), sub in existing.items():
+            if user_id not in wanted_ids or sub['status'] not in ('enabled', 'webhook_callback_verification_pending'):
+                await helix_request('DELETE', EVENTSUB_SUBSCRIPTIONS_URL, params={'id': sub['id']})
+                deleted += 1
+        for user_id in wanted_ids:
+            for sub_type in EVENTSUB_TYPES:
+                sub = existing.get((sub_type, user_id))
+                if sub is not None and sub['status'] in ('enabled', 'webhook_callback_verification_pending'):
+                    continue
+                await helix_request('POST', EVENTSUB_SUBSCRIPTIONS_URL, json={
+                    'type': sub_type,
+                    'version': '1',
+                    'condition': {'broadcaster_user_id': user_id},
+                    'transport': {'method': 'webhook', 'callback': self.callback_url, 'secret': self.secret},
+                })
+                created += 1
+        logger.info(f"EventSub sync: {len(wanted_ids)} streamer(s), {created} created, {deleted} deleted")
+
+    async def run(self, interval=EVENTSUB_SYNC_INTERVAL):
+        """Sync forever; polling slows down only while the last sync succeeded."""
+        from app import set_eventsub_active
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.sync()
+                set_eventsub_active(True)
+            except Exception as e:
+                logger.error(f"EventSub sync failed: {e}")
+                set_eventsub_active(False)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+subscription_manager = EventSubManager()
+
+
+def build_test_message(secret, subscription_type, login, message_type='notification', message_id=None):
+    """Build the headers and body Twitch would send, for exercising the endpoint locally."""
+    message_id = message_id or str(uuid.uuid4())
+    timestamp = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    subscription = {
+        'id': str(uuid.uuid4()),
+        'type': subscription_type,
+        'version': '1',
+        'status': 'enabled',
+        'condition': {'broadcaster_user_id': '0'},
+        'transport': {'method': 'webhook', 'callback': 'http://localhost/eventsub'},
+    }
+    payload = {'subscription': subscription}
+    if message_type == 'webhook_callback_verification':
+        payload['challenge'] = str(uuid.uuid4())
+    else:
+        payload['event'] = {
+            'id': str(uuid.uuid4()),
+            'broadcaster_user_id': '0',
+            'broadcaster_user_login': login,
+            'broadcaster_user_name': login,
+            'type': 'live',
+            'started_at': timestamp,
+        }
+    body = json.dumps(payload).encode()
+    headers = {
+        'Content-Type': 'application/json',
+        'Twitch-Eventsub-Message-Id': message_id,
+        'Twitch-Eventsub-Message-Timestamp': timestamp,
+        'Twitch-Eventsub-Message-Signature': sign_message(secret, message_id, timestamp, body),
+        'Twitch-Eventsub-Message-Type': message_type,
+        'Twitch-Eventsub-Subscription-Type': subscription_type,
+        'Twitch-Eventsub-Subscription-Version': '1',
+    }
+    return headers, body
+
+
+def send_test_message(url, secret, subscription_type, login, message_type='notification', message_id=None):
+    """POST a signed fake EventSub message to url and return (status, body)."""
+    headers, body = build_test_message(secret, subscription_type, login, message_type, message_id)
+    req = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send a fake, signed EventSub message to a local StreamGuard")
+    parser.add_argument('login')
+    parser.add_argument('--type', default='stream.online', choices=EVENTSUB_TYPES)
+    parser.add_argument('--message-type', default='notification', choices=['notification', 'webhook_callback_verification', 'revocation'])
+    parser.add_argument('--url', default=f"http://127.0.0.1:{os.environ.get('PORT', 5000)}/eventsub")
+    parser.add_argument('--secret', default=EVENTSUB_SECRET)
+    parser.add_argument('--message-id')
+    args = parser.parse_args()
+    status, text = send_test_message(args.url, args.secret, args.type, args.login, args.message_type, args.message_id)
+    print(f"{status} {text}")
@@ -1,24 +1,247 @@
 import sys
 import os
 import logging
+from collections import deque
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QTabWidget, QGroupBox, QListWidget, QLineEdit, QPushButton, 
-                             QFormLayout, QSpinBox, QMessageBox, QScrollArea, QPlainTextEdit,
-                             QDialog, QLabel)
-from PyQt6.QtCore import QTimer, Qt, Q_ARG, QMetaObject
+                             QFormLayout, QSpinBox, QMessageBox, QPlainTextEdit,
+                             QDialog, QLabel, QTableView, QAbstractItemView, QHeaderView, QComboBox)
+from PyQt6.QtCore import (QTimer, Qt, Q_ARG, QMetaObject, QAbstractTableModel, QModelIndex,
+                          QSortFilterProxyModel)
 from storage import (get_streamers, add_streamer, remove_streamer, get_server_data, set_server_data, 
                      get_youtubers, add_youtuber, remove_youtuber, get_all_guild_ids)
-from app import get_current_streamer, check_stream_status, get_oauth_token
+from live_status import current_snapshot
+from logging_setup import add_handler as add_log_handler
 
-class QTextEditLogger(logging.Handler):
-    def __init__(self, parent):
+LOG_MAX_LINES = int(os.getenv('GUI_LOG_MAX_LINES', 5000))  # Lines kept for the Logs tab
+LOG_DRAIN_INTERVAL = 200  # Milliseconds between moves of queued records into the Logs tab
+LOG_LEVELS = (('All', logging.NOTSET), ('Debug', logging.DEBUG), ('Info', logging.INFO),
+              ('Warning', logging.WARNING), ('Error', logging.ERROR))
+
+class QueueLogHandler(logging.Handler):
+    """Collects formatted log lines from any thread for the GUI to pick up.
+
+    emit() only formats the record and appends it to a deque, which is safe
+    without a lock, so the Discord, Flask and poller threads never wait on
+    the GUI or touch its widgets. The GUI thread drains the deque on a timer.
+    """
+
+    def __init__(self, max_lines=LOG_MAX_LINES):
         super().__init__()
-        self.widget = QPlainTextEdit(parent)
-        self.widget.setReadOnly(True)
+        # Bounded too: if the GUI falls behind, the oldest undrained lines are dropped
+        self.pending = deque(maxlen=max_lines)
+
+    def handle(self, record):
+        # Skip the handler lock that logging.Handler.handle takes around emit
+        if self.filter(record):
+            self.emit(record)
+        return record
 
     def emit(self, record):
-        msg = self.format(record)
-        self.widget.appendPlainText(msg)
+        try:
+            self.pending.append((record.levelno, self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+    def drain(self, limit):
+        lines = []
+        while self.pending and len(lines) < limit:
+            lines.append(self.pending.popleft())
+        return lines
+
+class LogView(QWidget):
+    """The Logs tab: the last max_lines log lines, with level and text filters.
+
+    Lines are kept pre-formatted in a ring buffer, so changing a filter
+    only re-joins the matching strings. New lines are appended once per
+    timer tick in a single batch with widget updates suspended.
+    """
+
+    def __init__(self, handler, max_lines=LOG_MAX_LINES, parent=None):
+        super().__init__(parent)
+        self.handler = handler
+        self.lines = deque(maxlen=max_lines)  # (levelno, text)
+        self.min_level = logging.NOTSET
+        self.text_filter = ''
+
+        layout = QVBoxLayout(self)
+        filters_layout = QHBoxLayout()
+        self.level_box = QComboBox()
+        for label, level in LOG_LEVELS:
+            self.level_box.addItem(label, level)
+        self.level_box.currentIndexChanged.connect(self.apply_filters)
+        filters_layout.addWidget(self.level_box)
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter log lines")
+        self.filter_edit.textChanged.connect(self.apply_filters)
+        filters_layout.addWidget(self.filter_edit)
+        layout.addLayout(filters_layout)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setMaximumBlockCount(max_lines)
+        layout.addWidget(self.text)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.drain)
+        self.timer.start(LOG_DRAIN_INTERVAL)
+
+    def _matches(self, levelno, text):
+        return levelno >= self.min_level and (not self.text_filter or self.text_filter in text.lower())
+
+    def drain(self):
+        new_lines = self.handler.drain(self.lines.maxlen)
+        if not new_lines:
+            return
+        self.lines.extend(new_lines)
+        visible = [text for levelno, text in new_lines if self._matches(levelno, text)]
+        if visible:
+            self._append('\n'.join(visible))
+
+    def apply_filters(self, *args):
+        self.min_level = self.level_box.currentData()
+        self.text_filter = self.filter_edit.text().lower()
+        self.text.setUpdatesEnabled(False)
+        self.text.setPlainText('\n'.join(text for levelno, text in self.lines if self._matches(levelno, text)))
+        self.text.setUpdatesEnabled(True)
+        self.text.verticalScrollBar().setValue(self.text.verticalScrollBar().maximum())
+
+    def _append(self, block):
+        scrollbar = self.text.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        self.text.setUpdatesEnabled(False)
+        self.text.appendPlainText(block)
+        self.text.setUpdatesEnabled(True)
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+class ServerTableModel(QAbstractTableModel):
+    """Guilds shown on the Servers tab, one row each.
+
+    Rows are inserted, removed and updated individually instead of being
+    rebuilt, and cell values are read on demand from the guild config cache
+    and the live snapshot, so only the rows the view paints cost anything.
+    """
+
+    COLUMNS = ('Server', 'ID', 'Streamers', 'Live')
+    NAME, ID, STREAMERS, LIVE = range(len(COLUMNS))
+    SortRole = Qt.ItemDataRole.UserRole + 1
+    RESET_THRESHOLD = 200  # Past this many removals at once, a model reset is cheaper
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ids = []  # Guild ids as strings, in row order
+        self._rows = {}  # guild id -> row
+        self._names = {}
+        self._snapshot_version = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        guild_id, column = self._ids[index.row()], index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return str(self._value(guild_id, column))
+        if role == self.SortRole:
+            return self._value(guild_id, column)
+        if role == Qt.ItemDataRole.TextAlignmentRole and column != self.NAME:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def _value(self, guild_id, column):
+        if column == self.NAME:
+            return self.server_name(guild_id)
+        if column == self.ID:
+            return int(guild_id)
+        streamers = get_streamers(guild_id)
+        if column == self.STREAMERS:
+            return len(streamers)
+        snapshot = current_snapshot()
+        return sum(1 for streamer in streamers if snapshot.is_live(streamer))
+
+    def guild_id(self, row):
+        return self._ids[row]
+
+    def server_name(self, guild_id):
+        return self._names.get(str(guild_id), f"Unknown Server {guild_id}")
+
+    def upsert_server(self, guild_id, name):
+        """Add a guild, or update its row if it is already listed."""
+        guild_id = str(guild_id)
+        self._names[guild_id] = name
+        row = self._rows.get(guild_id)
+        if row is None:
+            row = len(self._ids)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._ids.append(guild_id)
+            self._rows[guild_id] = row
+            self.endInsertRows()
+        else:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+
+    def remove_server(self, guild_id):
+        guild_id = str(guild_id)
+        row = self._rows.pop(guild_id, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._ids[row]
+        self._names.pop(guild_id, None)
+        for later_row in range(row, len(self._ids)):
+            self._rows[self._ids[later_row]] = later_row
+        self.endRemoveRows()
+
+    def set_servers(self, servers):
+        """Bring the rows in line with a {guild_id: name} map, touching only what changed."""
+        servers = {str(guild_id): name for guild_id, name in servers.items()}
+        removed = [guild_id for guild_id in self._ids if guild_id not in servers]
+        if len(removed) > self.RESET_THRESHOLD:
+            self.beginResetModel()
+            self._ids = list(servers)
+            self._rows = {guild_id: row for row, guild_id in enumerate(self._ids)}
+            self._names = servers
+            self.endResetModel()
+            return
+        for guild_id in removed:
+            self.remove_server(guild_id)
+
+        added = [guild_id for guild_id in servers if guild_id not in self._rows]
+        for guild_id, name in servers.items():
+            row = self._rows.get(guild_id)
+            if row is not None and self._names.get(guild_id) != name:
+                self._names[guild_id] = name
+                self.dataChanged.emit(self.index(row, self.NAME), self.index(row, self.NAME))
+        if added:
+            first = len(self._ids)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for guild_id in added:
+                self._rows[guild_id] = len(self._ids)
+                self._ids.append(guild_id)
+                self._names[guild_id] = servers[guild_id]
+            self.endInsertRows()
+        # Streamer counts may have changed anywhere; the view only repaints visible rows
+        self._emit_column_changed(self.STREAMERS, self.LIVE)
+
+    def refresh_live(self):
+        """Repaint the Live column when the poller has published a new snapshot."""
+        version = current_snapshot().version
+        if version != self._snapshot_version:
+            self._snapshot_version = version
+            self._emit_column_changed(self.LIVE, self.LIVE)
+
+    def _emit_column_changed(self, first_column, last_column):
+        if self._ids:
+            self.dataChanged.emit(self.index(0, first_column), self.index(len(self._ids) - 1, last_column))
 
 class StreamGuardGUI(QMainWindow):
     def __init__(self):
@@ -27,10 +250,9 @@ class StreamGuardGUI(QMainWindow):
         self.setGeometry(100, 100, 800, 600)
 
         # Set up logging
-        self.logTextBox = QTextEditLogger(self)
-        self.logTextBox.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        logging.getLogger().addHandler(self.logTextBox)
-        logging.getLogger().setLevel(logging.INFO)
+        self.log_handler = QueueLogHandler()
+        self.log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        add_log_handler(self.log_handler)
 
         self.get_all_streamers_func = None
         self.get_server_names_func = None
@@ -62,49 +284,63 @@ class StreamGuardGUI(QMainWindow):
         servers_tab = QWidget()
         servers_layout = QVBoxLayout(servers_tab)
 
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_content = QWidget()
-        scroll_layout = QVBoxLayout(scroll_content)
-
-        self.servers_list = QVBoxLayout()
-        scroll_layout.addLayout(self.servers_list)
-        scroll_layout.addStretch(1)  
-
-        scroll_content.setLayout(scroll_layout)
-        scroll_area.setWidget(scroll_content)
-
-        servers_layout.addWidget(scroll_area)
-
-    
+        self.servers_filter = QLineEdit()
+        self.servers_filter.setPlaceholderText("Filter servers by name or ID")
+        servers_layout.addWidget(self.servers_filter)
+
+        self.servers_model = ServerTableModel(self)
+        self.servers_proxy = QSortFilterProxyModel(self)
+        self.servers_proxy.setSourceModel(self.servers_model)
+        self.servers_proxy.setSortRole(ServerTableModel.SortRole)
+        self.servers_proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.servers_proxy.setFilterKeyColumn(-1)  # Match against every column
+        self.servers_filter.textChanged.connect(self.servers_proxy.setFilterFixedString)
+
+        self.servers_view = QTableView()
+        self.servers_view.setModel(self.servers_proxy)
+        self.servers_view.setSortingEnabled(True)
+        self.servers_view.sortByColumn(ServerTableModel.NAME, Qt.SortOrder.AscendingOrder)
+        self.servers_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.servers_view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.servers_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.servers_view.verticalHeader().hide()
+        # Fixed row heights let the view lay out thousands of rows without measuring them
+        self.servers_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.servers_view.horizontalHeader().setSectionResizeMode(ServerTableModel.NAME, QHeaderView.ResizeMode.Stretch)
+        self.servers_view.doubleClicked.connect(self.show_selected_server_details)
+        servers_layout.addWidget(self.servers_view)
+
+        buttons_layout = QHBoxLayout()
+        details_button = QPushButton("Details")
+        details_button.clicked.connect(self.show_selected_server_details)
+        buttons_layout.addWidget(details_button)
         refresh_button = QPushButton("Refresh Servers")
         refresh_button.clicked.connect(self.update_servers_list)
-        servers_layout.addWidget(refresh_button)
+        buttons_layout.addWidget(refresh_button)
+        servers_layout.addLayout(buttons_layout)
+
+        self.live_timer = QTimer(self)
+        self.live_timer.timeout.connect(self.servers_model.refresh_live)
+        self.live_timer.start(5000)
 
         self.tab_widget.addTab(servers_tab, "Servers")
 
     def update_servers_list(self):
+        self.servers_model.set_servers(dict(self.get_discord_servers()))
 
-        for i in reversed(range(self.servers_list.count())):
-            widget = self.servers_list.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
-
-        servers = self.get_discord_servers()
-        for server_id, server_name in servers:
-            server_widget = QWidget()
-            server_layout = QHBoxLayout(server_widget)
+    def add_server(self, server_id, server_name):
+        self.servers_model.upsert_server(server_id, server_name)
 
-            label = QLabel(f"{server_name} (ID: {server_id})")
-            server_layout.addWidget(label)
+    def remove_server(self, server_id):
+        self.servers_model.remove_server(server_id)
 
-            details_button = QPushButton("Details")
-            details_button.clicked.connect(lambda checked, sid=server_id, sname=server_name: self.show_server_details(sid, sname))
-            server_layout.addWidget(details_button)
-
-            self.servers_list.addWidget(server_widget)
-
-        self.servers_list.addStretch(1)
+    def show_selected_server_details(self, *args):
+        selected = self.servers_view.selectionModel().selectedRows()
+        if not selected:
+            return
+        row = self.servers_proxy.mapToSource(selected[0]).row()
+        server_id = self.servers_model.guild_id(row)
+        self.show_server_details(server_id, self.servers_model.server_name(server_id))
 
     def show_server_details(self, server_id, server_name):
     
@@ -125,6 +361,14 @@ class StreamGuardGUI(QMainWindow):
         else:
             details_layout.addWidget(QLabel("No additional data available for this server."))
 
+        snapshot = current_snapshot()
+        live = [snapshot.get(streamer) for streamer in get_streamers(server_id) if snapshot.is_live(streamer)]
+        if live:
+            for status in live:
+                details_layout.addWidget(QLabel(f"Live: {status.login} - {status.title} ({status.category})"))
+        else:
+            details_layout.addWidget(QLabel("Live: none"))
+
         close_button = QPushButton("Close")
         close_button.clicked.connect(details_dialog.close)
         details_layout.addWidget(close_button)
@@ -133,33 +377,20 @@ class StreamGuardGUI(QMainWindow):
         details_dialog.exec()
 
     def get_discord_servers(self):
+        """Return (guild_id, name) for every guild with stored settings or the bot in it."""
         try:
-            guild_info = []
-            guild_ids = get_all_guild_ids()
-            server_names = self.get_server_names()
-        
-            logging.info(f"Fetched guild IDs: {guild_ids}")
-            logging.info(f"Fetched server names: {server_names}")
-        
-            for guild_id in guild_ids:
-                # Convert guild_id to int for comparison
-                guild_id_int = int(guild_id)
-                guild_name = server_names.get(guild_id_int, f"Unknown Server {guild_id}")
-                guild_info.append((guild_id, guild_name))
-
-            logging.info(f"Compiled guild info: {guild_info}")
-            return guild_info
+            server_names = {str(guild_id): name for guild_id, name in self.get_server_names().items()}
+            guild_ids = list(dict.fromkeys([str(guild_id) for guild_id in get_all_guild_ids()] + list(server_names)))
+            logging.debug(f"Compiled guild info for {len(guild_ids)} server(s)")
+            return [(guild_id, server_names.get(guild_id, f"Unknown Server {guild_id}")) for guild_id in guild_ids]
         except Exception as e:
             logging.error(f"Error in get_discord_servers: {e}")
             return []
 
-        
     def get_server_names(self):
         try:
             if self.get_server_names_func:
-                server_names = self.get_server_names_func()
-                logging.info(f"Server names fetched: {server_names}")
-                return server_names
+                return self.get_server_names_func()
             else:
                 logging.warning("get_server_names_func is not set")
                 return {}
@@ -173,7 +404,8 @@ class StreamGuardGUI(QMainWindow):
         layout = QVBoxLayout()
         logs_tab.setLayout(layout)
 
-        layout.addWidget(self.logTextBox.widget)
+        self.log_view = LogView(self.log_handler)
+        layout.addWidget(self.log_view)
 
         self.tab_widget.addTab(logs_tab, "Logs")
 
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10  # Total seconds allowed per request, including reading the body
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 10
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle pooled connection is kept open
+
+
+class HttpError(Exception):
+    """Raised for HTTP error statuses and for transport failures (status is None)."""
+
+    def __init__(self, message, status=None, response=None):
+        super().__init__(message)
+        self.status = status
+        self.response = response
+
+
+class HttpResponse:
+    """A fully read response, so the connection goes back to the pool right away."""
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self):
+        return self.body.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.body)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise HttpError(f"{self.status} error for {self.url}", status=self.status, response=self)
+
+
+class HttpClient:
+    """Non-blocking HTTP client shared by the Twitch and YouTube pollers.
+
+    Connections are pooled and kept alive across requests. Each host gets its
+    own semaphore so a slow host cannot take every connection, and every
+    request is bounded by a total timeout. The aiohttp session is created
+    lazily on the running event loop and recreated if that loop changes.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, limit=MAX_CONNECTIONS,
+                 limit_per_host=MAX_CONNECTIONS_PER_HOST, host_limits=None):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.host_limits = dict(host_limits or {})
+        self._session = None
+        self._loop = None
+        self._host_semaphores = {}
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+            self._host_semaphores = {}
+        return self._session
+
+    def _host_semaphore(self, host):
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.host_limits.get(host, self.limit_per_host))
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def request(self, method, url, **kwargs):
+        """Send a request and return an HttpResponse with the body already read.
+
+        Extra keyword arguments are passed through to aiohttp (params, data,
+        headers, ...). Transport errors and timeouts are raised as HttpError.
+        """
+        session = self._get_session()
+        host = urlsplit(url).hostname
+        async with self._host_semaphore(host):
+            start = time.perf_counter()
+            status = 'cancelled'
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    body = await response.read()
+                    status = response.status
+                    return HttpResponse(str(response.url), response.status, response.headers, body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = 'error'
+                raise HttpError(f"{method} {url} failed: {e!r}") from e
+            finally:
+                metrics.http_request_seconds.labels(host).observe(time.perf_counter() - start)
+                metrics.http_responses_total.labels(host, status).inc()
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
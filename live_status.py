@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+StreamStatus = namedtuple('StreamStatus', ['login', 'title', 'category', 'started_at', 'last_checked'])
+
+
+class LiveSnapshot:
+    """An immutable view of which Twitch streamers are live, as last polled.
+
+    The poller builds a new snapshot after every check and swaps it in whole,
+    so readers in any thread get a consistent view without locking or
+    network I/O. version increases by one with every published snapshot.
+    """
+
+    __slots__ = ('version', 'published_at', 'streams')
+
+    def __init__(self, version, streams, published_at):
+        self.version = version
+        self.published_at = published_at
+        self.streams = MappingProxyType(streams)
+
+    def is_live(self, login):
+        return login.lower() in self.streams
+
+    def get(self, login):
+        """Return the StreamStatus for a login, or None if it isn't live."""
+        return self.streams.get(login.lower())
+
+    def first_live(self, logins):
+        """Return the first of the given logins that is live, or None."""
+        for login in logins:
+            if login.lower() in self.streams:
+                return login
+        return None
+
+
+_snapshot = LiveSnapshot(0, {}, 0.0)
+_publish_lock = threading.Lock()
+_listeners = []
+
+
+def add_listener(callback):
+    """Call callback(changes, checked_at) after every publish.
+
+    changes maps every login in the published statuses to its stream info
+    if it is live in the new snapshot and to None otherwise, plus each
+    other login that dropped out of the snapshot to None. Offline results
+    are passed on even for logins this snapshot never had, so applying
+    changes with publish() elsewhere also clears streams another process
+    still shows as live.
+    """
+    _listeners.append(callback)
+
+
+def remove_listener(callback):
+    _listeners.remove(callback)
+
+
+def current_snapshot():
+    """Return the latest published snapshot."""
+    return _snapshot
+
+
+def publish(statuses, tracked=None, checked_at=None):
+    """Merge one poll's results into a new snapshot and publish it.
+
+    statuses maps lowercased logins to stream info dicts, or to None if the
+    streamer is offline. Logins absent from statuses keep their previous
+    entry, since their status is unknown. If tracked is given, entries for
+    logins outside it are dropped.
+    """
+    global _snapshot
+    checked_at = checked_at if checked_at is not None else time.time()
+    with _publish_lock:
+        streams = dict(_snapshot.streams)
+        for login, info in statuses.items():
+            if info:
+                streams[login] = StreamStatus(login, info['title'], info['category'], info.get('started_at'), checked_at)
+            else:
+                streams.pop(login, None)
+        if tracked is not None:
+            tracked = {login.lower() for login in tracked}
+            streams = {login: status for login, status in streams.items() if login in tracked}
+        previous, _snapshot = _snapshot, LiveSnapshot(_snapshot.version + 1, streams, checked_at)
+        snapshot = _snapshot
+    if _listeners:
+        changes = {login: info if login in snapshot.streams else None for login, info in statuses.items()}
+        changes.update((login, None) for login in previous.streams if login not in snapshot.streams)
+        for listener in _listeners:
+            listener(changes, checked_at)
+    return snapshot
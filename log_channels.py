@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+from storage import get_server_data, set_server_data
+
+logger = logging.getLogger(__name__)
+
+
+def log_channel_name(guild):
+    return f"log-{guild.name.lower().replace(' ', '-')}"
+
+
+class LogChannelResolver:
+    """Maps each source guild to its mirror channel in the log guild.
+
+    Lookups are dict hits once a guild has been resolved. The name index of
+    the log guild's text channels is kept current from channel create and
+    delete events instead of being rescanned per message. A guild's channel
+    is created at most once at a time: concurrent misses for the same guild
+    wait on the same creation.
+    """
+
+    def __init__(self, bot, log_guild_id, category_id):
+        self.bot = bot
+        self.log_guild_id = log_guild_id
+        self.category_id = category_id
+        self._by_guild = {}  # source guild id -> log channel
+        self._guild_by_channel = {}  # log channel id -> source guild id
+        self._by_name = {}  # channel name -> log guild text channel
+        self._pending = {}  # source guild id -> task resolving its channel
+
+    def index(self):
+        """Rebuild the name index from the log guild, e.g. on (re)connect."""
+        log_guild = self.bot.get_guild(self.log_guild_id)
+        if log_guild is None:
+            logger.error(f"Log guild with ID {self.log_guild_id} not found.")
+            return
+        self._by_name = {channel.name: channel for channel in log_guild.text_channels}
+
+    def channel_created(self, channel):
+        if channel.guild.id == self.log_guild_id and hasattr(channel, 'send'):
+            self._by_name[channel.name] = channel
+
+    def channel_deleted(self, channel):
+        if channel.guild.id != self.log_guild_id:
+            return
+        if self._by_name.get(channel.name) is channel:
+            del self._by_name[channel.name]
+        guild_id = self._guild_by_channel.pop(channel.id, None)
+        if guild_id is not None:
+            self._by_guild.pop(guild_id, None)
+
+    def get(self, guild_id):
+        """Return the cached log channel for a guild, or None if it isn't resolved yet."""
+        return self._by_guild.get(guild_id)
+
+    async def resolve(self, guild):
+        """Return the guild's log channel, finding or creating it on first use."""
+        channel = self._by_guild.get(guild.id)
+        if channel is not None:
+            return channel
+        task = self._pending.get(guild.id)
+        if task is None:
+            task = self._pending[guild.id] = asyncio.ensure_future(self._resolve(guild))
+            task.add_done_callback(lambda _: self._pending.pop(guild.id, None))
+        return await asyncio.shield(task)
+
+    async def _resolve(self, guild):
+        log_channel_id = (get_server_data(guild.id) or {}).get('log_channel_id')
+        channel = self.bot.get_channel(log_channel_id) if log_channel_id else None
+
+        if channel is None:
+            name = log_channel_name(guild)
+            channel = self._by_name.get(name)
+            if channel is None:
+                log_guild = self.bot.get_guild(self.log_guild_id)
+                if log_guild is None:
+                    logger.error(f"Log guild with ID {self.log_guild_id} not found.")
+                    return None
+                category = log_guild.get_channel(self.category_id)
+                if category is None:
+                    logger.error(f"Category with ID {self.category_id} not found in log guild {log_guild.name} (ID: {log_guild.id})")
+                    return None
+                try:
+                    channel = await log_guild.create_text_channel(name, category=category)
+                except Exception as e:
+                    logger.error(f"Failed to create log channel: {e}")
+                    return None
+                self._by_name[channel.name] = channel
+                logger.info(f"Created new log channel: {channel.name} in log guild {log_guild.name} (ID: {log_guild.id})")
+            set_server_data(guild.id, log_channel_id=channel.id)
+
+        self._by_guild[guild.id] = channel
+        self._guild_by_channel[channel.id] = guild.id
+        return channel
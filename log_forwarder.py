@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import os
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+MAX_EMBEDS_PER_MESSAGE = 10  # Discord's limit per message
+MAX_EMBED_CHARS_PER_MESSAGE = 6000  # Discord's limit on the combined size of a message's embeds
+FLUSH_INTERVAL = 2.0  # Seconds a partial batch waits for more embeds before it is sent
+QUEUE_SIZE = int(os.getenv('LOG_FORWARD_QUEUE_SIZE', 500))  # Per log channel
+OVERFLOW_POLICY = os.getenv('LOG_FORWARD_POLICY', 'drop')  # 'drop' the oldest queued embed, or 'spill' to disk
+SPILL_DIR = os.getenv('LOG_FORWARD_SPILL_DIR', 'log_spill')
+
+
+class LogForwarder:
+    """Mirrors message embeds to log channels in the background.
+
+    Each log channel gets its own bounded queue and worker task. A worker
+    packs up to ten embeds into one message, sending as soon as a batch is
+    full or FLUSH_INTERVAL after its first embed. When a queue is full,
+    the 'drop' policy discards the oldest embed. The 'spill' policy
+    appends the new one to a JSON-lines file, which is replayed once the
+    queue drains. The file is read forward from a saved offset and only
+    removed once fully replayed; its I/O runs in a thread, one operation
+    per channel at a time.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, flush_interval=FLUSH_INTERVAL, policy=OVERFLOW_POLICY, spill_dir=SPILL_DIR):
+        if policy not in ('drop', 'spill'):
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.spill_dir = spill_dir
+        self.dropped = 0
+        self.spilled = 0
+        self.sent_messages = 0
+        self._queues = {}
+        self._channels = {}
+        self._workers = {}
+        self._spilling = set()  # Channels with a spill file; new embeds queue behind it to keep order
+        self._spill_pending = {}  # channel_id -> JSON lines not yet appended to the spill file
+        self._spill_locks = {}
+        self._spill_tasks = set()
+
+    def enqueue(self, channel, embed):
+        """Queue an embed for a log channel without waiting. Must run on the bot's loop."""
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = asyncio.Queue(self.queue_size)
+            if os.path.exists(self._spill_path(channel.id)):
+                # Left by a previous run; replay it before anything queued now
+                self._spilling.add(channel.id)
+            self._workers[channel.id] = asyncio.get_running_loop().create_task(self._worker(channel.id))
+        self._channels[channel.id] = channel
+        if channel.id in self._spilling:
+            self._spill(channel.id, embed)
+            return
+        try:
+            queue.put_nowait(embed)
+        except asyncio.QueueFull:
+            if self.policy == 'spill':
+                self._spill(channel.id, embed)
+            else:
+                queue.get_nowait()
+                queue.put_nowait(embed)
+                self.dropped += 1
+                if self.dropped % 100 == 1:
+                    logger.warning(f"Log channel {channel.id} is backed up, dropped {self.dropped} embed(s) so far")
+
+    def queue_depths(self):
+        # Called from the metrics scrape thread; snapshot the dict the loop may be resizing
+        return {channel_id: queue.qsize() for channel_id, queue in list(self._queues.items())}
+
+    def _spill_path(self, channel_id):
+        return os.path.join(self.spill_dir, f"{channel_id}.jsonl")
+
+    def _offset_path(self, channel_id):
+        return os.path.join(self.spill_dir, f"{channel_id}.offset")
+
+    def _spill_lock(self, channel_id):
+        lock = self._spill_locks.get(channel_id)
+        if lock is None:
+            lock = self._spill_locks[channel_id] = asyncio.Lock()
+        return lock
+
+    def _spill(self, channel_id, embed):
+        pending = self._spill_pending.get(channel_id)
+        if pending is None:
+            pending = self._spill_pending[channel_id] = []
+            task = asyncio.get_running_loop().create_task(self._flush_spill(channel_id))
+            self._spill_tasks.add(task)
+            task.add_done_callback(self._spill_tasks.discard)
+        pending.append(json.dumps(embed.to_dict()) + '\n')
+        self._spilling.add(channel_id)
+        self.spilled += 1
+
+    async def _flush_spill(self, channel_id):
+        async with self._spill_lock(channel_id):
+            await self._write_pending(channel_id)
+
+    async def _write_pending(self, channel_id):
+        """Append the channel's pending spilled embeds to its spill file. Call with the channel's spill lock held."""
+        lines = self._spill_pending.pop(channel_id, None)
+        if lines:
+            try:
+                await asyncio.to_thread(self._append_lines, channel_id, lines)
+            except Exception as e:
+                logger.error(f"Failed to spill {len(lines)} embed(s) for log channel {channel_id}: {e}")
+
+    def _append_lines(self, channel_id, lines):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        with open(self._spill_path(channel_id), 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+
+    def _read_spill(self, channel_id, count):
+        """Read up to count lines after the saved offset; returns (lines, whether the file is used up)."""
+        path = self._spill_path(channel_id)
+        try:
+            with open(self._offset_path(channel_id), encoding='utf-8') as f:
+                offset = int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            offset = 0
+        try:
+            with open(path, encoding='utf-8') as f:
+                f.seek(offset)
+                lines = []
+                while len(lines) < count:
+                    line = f.readline()
+                    if not line:
+                        break
+                    lines.append(line)
+                offset = f.tell()
+                done = not f.readline()
+        except FileNotFoundError:
+            return [], True
+        if lines:
+            with open(self._offset_path(channel_id), 'w', encoding='utf-8') as f:
+                f.write(str(offset))
+        return lines, done
+
+    def _remove_spill(self, channel_id):
+        for path in (self._spill_path(channel_id), self._offset_path(channel_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def _unspill(self, channel_id):
+        """Move spilled embeds back into the queue as far as it has room."""
+        queue = self._queues[channel_id]
+        async with self._spill_lock(channel_id):
+            while True:
+                # Embeds spilled since the last flush are part of the file too
+                await self._write_pending(channel_id)
+                room = self.queue_size - queue.qsize()
+                if room <= 0:
+                    return
+                lines, done = await asyncio.to_thread(self._read_spill, channel_id, room)
+                for line in lines:
+                    queue.put_nowait(discord.Embed.from_dict(json.loads(line)))
+                if done and channel_id not in self._spill_pending:
+                    # Embeds spilled from now on start a new file, which waits for the lock
+                    self._spilling.discard(channel_id)
+                    await asyncio.to_thread(self._remove_spill, channel_id)
+                    return
+                if lines:
+                    return
+
+    async def _next_batch(self, queue, first=None):
+        """Collect one message's worth of embeds; returns (batch, embed carried to the next batch)."""
+        loop = asyncio.get_running_loop()
+        batch = [first if first is not None else await queue.get()]
+        size = len(batch[0])
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < MAX_EMBEDS_PER_MESSAGE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                embed = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if size + len(embed) > MAX_EMBED_CHARS_PER_MESSAGE:
+                return batch, embed
+            batch.append(embed)
+            size += len(embed)
+        return batch, None
+
+    async def _worker(self, channel_id):
+        queue = self._queues[channel_id]
+        carry = None
+        while True:
+            if carry is None and queue.empty() and channel_id in self._spilling:
+                await self._unspill(channel_id)
+            batch, carry = await self._next_batch(queue, carry)
+            try:
+                await self._channels[channel_id].send(embeds=batch)
+                self.sent_messages += 1
+            except Exception as e:
+                logger.error(f"Failed to send {len(batch)} embed(s) to log channel {channel_id}: {e}")
+
+    async def close(self):
+        # Spilled embeds still in memory are written out for the next run
+        await asyncio.gather(*self._spill_tasks, return_exceptions=True)
+        for task in self._workers.values():
+            task.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
@@ -0,0 +1,152 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.getenv('LOG_FILE', 'streamguard.log')  # JSON lines; empty to log to the console only
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # Records waiting for the writer thread
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', 20))  # Records per call site per window...
+LOG_SAMPLE_WINDOW = float(os.getenv('LOG_SAMPLE_WINDOW', 60))  # ...below ERROR, the rest are counted and dropped
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+_queue_handler = None
+_listener = None
+_handlers = []
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the call site and any suppressed-record count."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.processName,
+            'thread': record.threadName,
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class CallSiteSampler(logging.Filter):
+    """Lets at most `burst` records per call site through each `window` seconds.
+
+    Records at ERROR and above always pass. The first record let through
+    after a window carries the number dropped as `suppressed`. Runs on the
+    logging thread before the record is queued, so dropped records cost a
+    lock and a dict lookup.
+    """
+
+    def __init__(self, burst=LOG_SAMPLE_BURST, window=LOG_SAMPLE_WINDOW, always_level=logging.ERROR):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.always_level = always_level
+        self._sites = {}  # (pathname, lineno) -> [window start, records passed, records dropped]
+        self._lock = threading.Lock()  # Records arrive from the loop, Flask, GUI and pipe reader threads
+
+    def filter(self, record):
+        if record.levelno >= self.always_level:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or record.created - site[0] >= self.window:
+                if site is not None and site[2]:
+                    record.suppressed = site[2]
+                self._sites[key] = [record.created, 1, 0]
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queues records for the listener thread without formatting them, dropping them if the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge args now since they may change later; formatting proper happens on the listener thread
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level=LOG_LEVEL, log_file=LOG_FILE):
+    """Route all logging through a queue to a background writer thread.
+
+    The writer sends JSON lines to a rotating log_file and plain text to
+    the console. Safe to call more than once; later calls only change the
+    level.
+    """
+    global _queue_handler, _listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _queue_handler is not None:
+        return _queue_handler
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    _handlers.append(console)
+    if log_file:
+        file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        _handlers.append(file_handler)
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(CallSiteSampler())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    _start_listener()
+    atexit.register(stop_logging)
+    return _queue_handler
+
+
+def _start_listener():
+    global _listener
+    _listener = QueueListener(_queue_handler.queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def add_handler(handler):
+    """Have the writer thread also feed handler, e.g. the GUI's log view."""
+    if _queue_handler is None:
+        logging.getLogger().addHandler(handler)
+        return
+    _listener.stop()
+    _handlers.append(handler)
+    _start_listener()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
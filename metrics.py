@@ -0,0 +1,193 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)  # SQLite and handler times
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """Base for metrics with optional labels; each label combination is a child kept in a dict.
+
+    Looking up an existing child takes no lock, and each child has its own
+    lock for updates, so writers on different series never contend.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        with _registry_lock:
+            _registry.append(self)
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield from child.samples(self.name, self.labelnames, values)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines += self._samples()
+        return '\n'.join(lines)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labelnames, values):
+        yield f'{name}{_format_labels(labelnames, values)} {_format_value(self.value)}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    def __init__(self):
+        super().__init__()
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead of tracking it."""
+        self.function = function
+
+    def samples(self, name, labelnames, values):
+        value = self.function() if self.function is not None else self.value
+        yield f'{name}{_format_labels(labelnames, values)} {_format_value(value)}'
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def set_function(self, function):
+        self._children[()].set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is the +Inf bucket
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            yield f'{name}_bucket{_format_labels(labelnames, values, [("le", _format_value(float(bound)))])} {cumulative}'
+        yield f'{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}'
+        yield f'{name}_count{_format_labels(labelnames, values)} {cumulative}'
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+
+def render():
+    """Return every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# Metrics shared across modules. Anything that is cheap to read on demand
+# (queue depths, rate-limit budget) is a gauge with set_function instead.
+poll_cycle_seconds = Histogram('streamguard_poll_cycle_seconds', 'Time spent on one poll cycle that had checks due.')
+http_request_seconds = Histogram('streamguard_http_request_seconds', 'Outgoing HTTP request latency.', ['host'])
+http_responses_total = Counter('streamguard_http_responses_total', 'Outgoing HTTP responses by status, or "error" for transport failures.', ['host', 'status'])
+sqlite_queries_total = Counter('streamguard_sqlite_queries_total', 'SQLite statements and transactions run.', ['operation'])
+sqlite_query_seconds = Histogram('streamguard_sqlite_query_seconds', 'SQLite statement and transaction time.', ['operation'], buckets=FAST_BUCKETS)
+notification_send_seconds = Histogram('streamguard_notification_send_seconds', 'Time to deliver one notification, retries included.')
+notifications_total = Counter('streamguard_notifications_total', 'Notifications delivered or given up on.', ['result'])
+notification_retries_total = Counter('streamguard_notification_retries_total', 'Notification send retries by status.', ['status'])
+on_message_seconds = Histogram('streamguard_on_message_seconds', 'Time spent in the on_message handler.', buckets=FAST_BUCKETS)
+queue_depth = Gauge('streamguard_queue_depth', 'Items waiting in internal queues.', ['queue'])
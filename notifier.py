@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque, namedtuple
+
+from discord.errors import Forbidden, HTTPException, NotFound, RateLimited
+
+import metrics
+from ratelimit import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CONCURRENCY = int(os.getenv('NOTIFY_CONCURRENCY', 10))  # Sends in flight across all channels
+NOTIFY_MAX_RETRIES = 3
+
+DeliveryResult = namedtuple('DeliveryResult', 'channel_id ok status error attempts')
+
+
+class NotificationDispatcher:
+    """Sends notifications concurrently while keeping each channel's messages in order.
+
+    Every channel has its own FIFO, drained by a worker task that exists
+    only while the channel has messages waiting. At most `concurrency`
+    sends are in flight at once. discord.py already paces requests by
+    their rate-limit bucket. When a 429 still comes back, only that
+    channel waits out its retry_after, or every channel does if the limit
+    is global. 5xx and transport errors are retried with backoff. Each
+    submitted message gets a future that resolves to a DeliveryResult.
+    """
+
+    def __init__(self, client=None, concurrency=NOTIFY_CONCURRENCY, max_retries=NOTIFY_MAX_RETRIES):
+        self.client = client  # The connected discord.Client; set before the first send
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.sent = 0
+        self.failed = 0
+        self._semaphore = None
+        self._global_resume = 0.0  # Loop time before which no channel may send
+        self._queues = {}  # channel id -> deque of (content, future)
+        self._workers = {}
+
+    def submit(self, channel_id, message, role_id=None):
+        """Queue one message and return a future for its DeliveryResult. Must run on the bot's loop."""
+        if role_id:
+            message = f"<@&{role_id}> {message}"
+        channel_id = int(channel_id)
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(channel_id, deque())
+        queue.append((message, future))
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.get_running_loop().create_task(self._worker(channel_id))
+        return future
+
+    def submit_many(self, deliveries):
+        """Queue (channel_id, message, role_id) tuples without waiting; returns their futures in order."""
+        return [self.submit(*delivery) for delivery in deliveries]
+
+    def pending(self):
+        # Called from the metrics scrape thread; snapshot the dict the loop may be resizing
+        return sum(len(queue) for queue in list(self._queues.values()))
+
+    async def drain(self):
+        """Wait until every queued message has been delivered or given up on."""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    async def _worker(self, channel_id):
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                message, future = queue.popleft()
+                start = time.perf_counter()
+                try:
+                    result = await self._deliver(channel_id, message)
+                except asyncio.CancelledError:
+                    self._fail(channel_id, future)
+                    raise
+                metrics.notification_send_seconds.observe(time.perf_counter() - start)
+                if result.ok:
+                    self.sent += 1
+                    metrics.notifications_total.labels('sent').inc()
+                else:
+                    self.failed += 1
+                    metrics.notifications_total.labels('failed').inc()
+                    logger.error(f"Failed to send notification to channel {channel_id} after {result.attempts} attempt(s): {result.error}")
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            del self._workers[channel_id]
+            del self._queues[channel_id]
+
+    async def _deliver(self, channel_id, message):
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self.client is None:
+            return DeliveryResult(channel_id, False, None, RuntimeError("no Discord client set"), 0)
+        # A partial messageable sends by id, so a channel missing from the cache costs no fetch
+        channel = self.client.get_partial_messageable(channel_id)
+        attempt = 0
+        while True:
+            attempt += 1
+            wait = self._global_resume - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                async with self._semaphore:
+                    await channel.send(message)
+                return DeliveryResult(channel_id, True, 200, None, attempt)
+            except (Forbidden, NotFound) as e:
+                return DeliveryResult(channel_id, False, e.status, e, attempt)
+            except RateLimited as e:
+                status, delay, error = 429, e.retry_after, e
+            except HTTPException as e:
+                if e.status == 429:
+                    delay = float(e.response.headers.get('Retry-After', 1))
+                    if e.response.headers.get('X-RateLimit-Global'):
+                        self._global_resume = max(self._global_resume, loop.time() + delay)
+                elif e.status >= 500:
+                    delay = backoff_delay(attempt - 1)
+                else:
+                    return DeliveryResult(channel_id, False, e.status, e, attempt)
+                status, error = e.status, e
+            except Exception as e:
+                status, delay, error = None, backoff_delay(attempt - 1), e
+            if attempt > self.max_retries:
+                return DeliveryResult(channel_id, False, status, error, attempt)
+            metrics.notification_retries_total.labels(status or 'error').inc()
+            logger.warning(f"Sending to channel {channel_id} failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _fail(channel_id, future):
+        if not future.done():
+            future.set_result(DeliveryResult(channel_id, False, None, RuntimeError('dispatcher closed'), 0))
+
+    async def close(self):
+        """Stop every worker; queued and in-flight messages resolve as failed."""
+        for channel_id, queue in list(self._queues.items()):
+            while queue:
+                self._fail(channel_id, queue.popleft()[1])
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Client-side copy of a server's rate-limit bucket.
+
+    Starts from a guessed capacity and refill rate and is corrected from the
+    server's Ratelimit-Limit, Ratelimit-Remaining and Ratelimit-Reset headers
+    after every response. When the budget runs out, acquire() queues callers
+    in arrival order until enough points have refilled.
+    """
+
+    def __init__(self, capacity, refill_period, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / refill_period  # Points per second
+        self.clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        if self._paused_until:
+            if now < self._paused_until:
+                return
+            # The server's bucket is full again at its reset time
+            self._tokens = float(self.capacity)
+            self._updated = self._paused_until
+            self._paused_until = 0.0
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    @property
+    def remaining(self):
+        """Estimate of the points available right now.
+
+        Read-only, so it is safe to call from other threads (e.g. a metrics
+        scrape) while acquire() runs on the loop.
+        """
+        now = self.clock()
+        tokens, updated, paused_until = self._tokens, self._updated, self._paused_until
+        if paused_until:
+            if now < paused_until:
+                return int(tokens)
+            tokens, updated = float(self.capacity), paused_until
+        return int(min(self.capacity, tokens + max(now - updated, 0.0) * self.rate))
+
+    async def acquire(self, cost=1):
+        """Wait until cost points are available, then take them."""
+        async with self._lock:
+            while True:
+                now = self.clock()
+                self._refill(now)
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return
+                wait = max(self._paused_until - now, (cost - self._tokens) / self.rate, 0.01)
+                logger.info(f"Rate limit budget exhausted, waiting {wait:.1f}s")
+                await asyncio.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """Resync the bucket from Ratelimit-* response headers, if present."""
+        try:
+            limit = int(headers['Ratelimit-Limit'])
+            remaining = int(headers['Ratelimit-Remaining'])
+        except (KeyError, ValueError):
+            return
+        now = self.clock()
+        self.capacity = limit
+        self._tokens = float(remaining)
+        self._updated = now
+        reset_in = self._reset_in(headers)
+        if reset_in and remaining < limit:
+            # The server refills to full by the reset time
+            self.rate = (limit - remaining) / reset_in
+
+    def pause_until_reset(self, headers, default=1.0):
+        """Empty the bucket after a 429 and hold requests until the reset time."""
+        reset_in = self._reset_in(headers) or default
+        now = self.clock()
+        self._tokens = 0.0
+        self._updated = now
+        self._paused_until = now + reset_in
+        return reset_in
+
+    @staticmethod
+    def _reset_in(headers):
+        try:
+            reset_at = float(headers['Ratelimit-Reset'])
+        except (KeyError, ValueError):
+            return None
+        return max(reset_at - time.time(), 0.0)
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
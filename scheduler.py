@@ -0,0 +1,158 @@
+import heapq
+import logging
+import math
+import random
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JITTER = 0.05  # Fraction of a key's period its fire time may move either way
+DEFAULT_BATCH_WINDOW = 5.0  # Keys due this close together are handed out in one batch
+
+
+def partition_of(key, partitions):
+    """Stable partition number in range(partitions) for a key, the same in every process."""
+    return zlib.crc32(key.encode('utf-8')) % partitions
+
+
+class PollScheduler:
+    """Fixed-rate scheduler that spreads periodic checks across their period.
+
+    Each key first comes due at a random offset within its period, then every
+    period after that. Due times advance from the previous due time, not from
+    when the check finished, so the rate doesn't drift with how long checks
+    take. Each fire time is moved by a little jitter so keys that share an
+    offset don't stay in lockstep. Keys due within batch_window of each other
+    are returned together, so callers can still batch their API requests.
+
+    If a key is handed out more than a full period late, the scheduler
+    counts an overrun, skips the missed periods and reports it.
+    """
+
+    def __init__(self, default_period, jitter=DEFAULT_JITTER, batch_window=DEFAULT_BATCH_WINDOW,
+                 clock=time.monotonic, rng=None):
+        self.default_period = default_period
+        self.jitter = jitter
+        self.batch_window = batch_window
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.overruns = 0
+        self._heap = []  # (fire_at, seq, key); entries whose seq is stale are skipped
+        self._entries = {}  # key -> (due, seq)
+        self._periods = {}
+        self._kind_periods = {}  # For (kind, name) keys: kind -> period
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def period(self, key):
+        period = self._periods.get(key)
+        if period is None and isinstance(key, tuple):
+            period = self._kind_periods.get(key[0])
+        return self.default_period if period is None else period
+
+    def kind_period(self, kind):
+        return self._kind_periods.get(kind, self.default_period)
+
+    def set_period(self, key, period):
+        """Poll one key every period seconds instead of the default.
+
+        Pass None to go back to the default period.
+        """
+        if period is None:
+            self._periods.pop(key, None)
+        else:
+            self._periods[key] = period
+        if key in self._entries:
+            self._push(key, self.clock() + self.rng.uniform(0, self.period(key)))
+
+    def set_kind_period(self, kind, period):
+        """Poll every (kind, name) key every period seconds instead of the default.
+
+        Pass None to go back to the default period. Keys now due later than
+        one new period away are moved up; keys with their own period keep
+        it. Lengthening the period takes effect as each key next fires.
+        """
+        if period is None:
+            self._kind_periods.pop(kind, None)
+        else:
+            self._kind_periods[kind] = period
+        period = self.kind_period(kind)
+        now = self.clock()
+        for key, (due, _) in list(self._entries.items()):
+            if isinstance(key, tuple) and key[0] == kind and key not in self._periods and due > now + period:
+                self._push(key, now + self.rng.uniform(0, period))
+
+    def add(self, key):
+        """Schedule a key at a random offset within its period."""
+        if key not in self._entries:
+            self._push(key, self.clock() + self.rng.uniform(0, self.period(key)))
+
+    def remove(self, key):
+        self._entries.pop(key, None)
+
+    def sync(self, keys):
+        """Schedule new keys and drop keys that are no longer in the set."""
+        keys = set(keys)
+        for key in list(self._entries):
+            if key not in keys:
+                del self._entries[key]
+        for key in keys:
+            self.add(key)
+        # Drop stale heap entries once they dominate, so removed keys don't pile up
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [item for item in self._heap if self._entries.get(item[2], (None, None))[1] == item[1]]
+            heapq.heapify(self._heap)
+
+    def _push(self, key, due):
+        self._seq += 1
+        self._entries[key] = (due, self._seq)
+        fire_at = due + self.rng.uniform(-self.jitter, self.jitter) * self.period(key)
+        heapq.heappush(self._heap, (fire_at, self._seq, key))
+
+    def _discard_stale(self):
+        while self._heap:
+            fire_at, seq, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def time_until_next(self, now=None):
+        """Seconds until the next key fires, or None if nothing is scheduled."""
+        self._discard_stale()
+        if not self._heap:
+            return None
+        now = self.clock() if now is None else now
+        return max(0.0, self._heap[0][0] - now)
+
+    def pop_due(self, now=None):
+        """Return the keys due now or within batch_window, and reschedule them."""
+        now = self.clock() if now is None else now
+        horizon = now + self.batch_window
+        due_keys = []
+        overrun_keys = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > horizon:
+                break
+            due_keys.append(heapq.heappop(self._heap)[2])
+        # Reschedule after popping, so a short-period key isn't handed out twice
+        for key in due_keys:
+            due, _ = self._entries[key]
+            period = self.period(key)
+            next_due = due + period
+            if now - due > period:
+                # Missed at least one whole period; skip ahead rather than firing a backlog
+                overrun_keys.append(key)
+                next_due = due + period * math.ceil((now - due) / period)
+            self._push(key, next_due)
+        if overrun_keys:
+            self.overruns += len(overrun_keys)
+            logger.warning(f"Poll scheduler overrun: {len(overrun_keys)} check(s) were more than a period late")
+        return due_keys
@@ -0,0 +1,162 @@
+"""Shares the poll workload between StreamGuard instances through leases.
+
+Streamer logins and YouTube handles hash into POLL_PARTITIONS partitions
+(scheduler.partition_of). Each instance heartbeats into the shared
+database. Every heartbeat it works out its fair share of partitions from
+the live instances, sorted by id, and holds a lease on each of them. A
+lease expires LEASE_TTL seconds after its last renewal, so the partitions
+of an instance that died are picked up by the others. When an instance
+joins or leaves, the shares move: a partition an instance no longer
+wants is dropped from its polling first and released one heartbeat
+later. That gives an in-flight poll cycle time to finish and save its
+live state before the new owner loads it.
+
+Each instance shows only the live streams it polls itself in its own
+snapshot, so owners also write their live streams to the live_streams
+table and every heartbeat merges the other partitions' rows into the
+local snapshot. Presence, the GUI and !streamers list therefore see
+every instance's streams, up to one heartbeat late.
+
+SQLite stands in for the shared store; every instance must use the same
+database file, and wall clocks are compared across instances.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+import live_status
+import metrics
+import storage
+from scheduler import partition_of
+
+POLL_PARTITIONS = int(os.getenv('POLL_PARTITIONS', 0))  # 0 turns sharding off: this instance polls everything
+INSTANCE_ID = os.getenv('INSTANCE_ID') or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+LEASE_TTL = float(os.getenv('LEASE_TTL', 30))
+LEASE_HEARTBEAT = float(os.getenv('LEASE_HEARTBEAT', 10))  # Must be well under LEASE_TTL
+GUILD_CHANGE_RETENTION = 3600  # Seconds guild change records are kept for other instances to read
+LIVE_STREAM_MAX_AGE = 600  # A shared live stream not refreshed for this long is treated as ended
+
+logger = logging.getLogger(__name__)
+
+owned_partitions = metrics.Gauge('streamguard_poll_partitions_owned', 'Poll partitions this instance holds a lease on.')
+
+
+class LeaseCoordinator:
+    """Keeps this instance's partition leases and tells on_change which partitions to poll.
+
+    on_change(owned, count) is called with the frozenset of partitions to
+    poll whenever it changes; polling nothing until the first heartbeat
+    is up to the caller. on_remote_guild_change(guild_id) is called for
+    guild config changes other instances made, so cached copies can be
+    dropped.
+    """
+
+    def __init__(self, on_change, on_remote_guild_change=storage.reload_guild, instance_id=INSTANCE_ID,
+                 partitions=POLL_PARTITIONS, ttl=LEASE_TTL, interval=LEASE_HEARTBEAT, clock=time.time):
+        self.on_change = on_change
+        self.on_remote_guild_change = on_remote_guild_change
+        self.instance_id = instance_id
+        self.partitions = partitions
+        self.ttl = ttl
+        self.interval = interval
+        self.clock = clock
+        self.owned = frozenset()
+        self._draining = frozenset()  # No longer polled, released at the next heartbeat
+        self._valid_until = 0.0
+        self._change_seq = None
+
+    def _set_owned(self, owned):
+        if owned != self.owned:
+            logger.info(f"Instance {self.instance_id} now polls {len(owned)} of {self.partitions} partition(s)")
+            self.owned = owned
+            owned_partitions.set(len(owned))
+            self.on_change(owned, self.partitions)
+
+    def heartbeat(self):
+        """Renew this instance's membership and leases, and rebalance if the membership changed."""
+        now = self.clock()
+        with storage.db.transaction():
+            members = storage.heartbeat_instance(self.instance_id, now, self.ttl)
+            rank = members.index(self.instance_id)
+            wanted = frozenset(range(rank, self.partitions, len(members)))
+            storage.release_leases(self.instance_id, self._draining - wanted)
+            # Leases being drained are renewed too, so nobody takes them before we let go
+            held = storage.claim_leases(self.instance_id, wanted | (self.owned - wanted), now, now + self.ttl)
+        self._valid_until = now + self.ttl - self.interval
+        self._draining = frozenset(held - wanted)
+        self._set_owned(frozenset(held & wanted))
+        self._read_guild_changes(now)
+        self._merge_live_streams(now)
+
+    def _read_guild_changes(self, now):
+        if self._change_seq is None:
+            self._change_seq = storage.get_last_guild_change()
+            return
+        for seq, guild_id in storage.get_guild_changes(self._change_seq, self.instance_id):
+            self._change_seq = seq
+            self.on_remote_guild_change(guild_id)
+        storage.prune_guild_changes(now - GUILD_CHANGE_RETENTION)
+
+    def _owns(self, login):
+        return partition_of(login, self.partitions) in self.owned
+
+    def _share_live_status(self, changes, checked_at):
+        owned = {login: info for login, info in changes.items() if self._owns(login)}
+        if not owned:
+            return
+        try:
+            storage.save_live_streams(owned, checked_at)
+        except Exception as e:
+            logger.error(f"Failed to share live status with other instances: {e}")
+
+    def _merge_live_streams(self, now):
+        """Bring other instances' live streams into this process's snapshot."""
+        shared = storage.get_live_streams(now - LIVE_STREAM_MAX_AGE)
+        snapshot = live_status.current_snapshot()
+        # Only what changed, so an idle heartbeat doesn't publish a new snapshot version
+        statuses = {login: info for login, info in shared.items() if not self._owns(login) and
+                    snapshot.streams.get(login, (None,) * 4)[1:4] != (info['title'], info['category'], info['started_at'])}
+        statuses.update((login, None) for login in snapshot.streams if not self._owns(login) and login not in shared)
+        if statuses:
+            live_status.publish(statuses)
+        storage.prune_live_streams(now - LIVE_STREAM_MAX_AGE)
+
+    def _record_guild_change(self, guild_id):
+        try:
+            storage.record_guild_change(guild_id, self.instance_id, self.clock())
+        except Exception as e:
+            logger.error(f"Failed to record change of guild {guild_id} for other instances: {e}")
+
+    def leave(self):
+        """Hand every partition back at once, e.g. on shutdown."""
+        self._set_owned(frozenset())
+        with storage.db.transaction():
+            storage.release_leases(self.instance_id)
+            storage.remove_instance(self.instance_id)
+        self._draining = frozenset()
+
+    async def run(self):
+        """Heartbeat every interval until cancelled, then leave."""
+        storage.guild_change_listeners.append(self._record_guild_change)
+        live_status.add_listener(self._share_live_status)
+        try:
+            while True:
+                try:
+                    self.heartbeat()
+                except Exception as e:
+                    logger.error(f"Lease heartbeat failed: {e}")
+                    if self.owned and self.clock() >= self._valid_until:
+                        # Our leases may already belong to someone else
+                        logger.warning("Leases could not be renewed in time, pausing polling")
+                        self._set_owned(frozenset())
+                await asyncio.sleep(self.interval)
+        finally:
+            storage.guild_change_listeners.remove(self._record_guild_change)
+            live_status.remove_listener(self._share_live_status)
+            try:
+                self.leave()
+            except Exception as e:
+                logger.error(f"Failed to release leases: {e}")
@@ -1,201 +1,783 @@
+import os
+import queue
 import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 
-def init_db():
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    
-    # Create server_data table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS server_data (
-            guild_id TEXT PRIMARY KEY,
-            role_id INTEGER,
-            channel_id INTEGER,
-            log_channel_id INTEGER,
-            youtube_channel_id INTEGER,
-            youtube_role_id INTEGER,
-            youtube_channel TEXT
-        )
-    ''')
-    
-    # Create streamers table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS streamers (
-            guild_id TEXT,
-            streamer_name TEXT,
-            PRIMARY KEY (guild_id, streamer_name)
+import metrics
+
+DB_PATH = os.getenv('DB_PATH', 'server_data.db')
+POOL_SIZE = 4
+STATEMENT_CACHE_SIZE = 128  # Compiled statements kept per connection, keyed by SQL text
+GUILD_CACHE_SIZE = int(os.getenv('GUILD_CACHE_SIZE', 10000))
+
+# Applied to every new connection. journal_mode=WAL lets readers run alongside
+# the writer, and synchronous=NORMAL is durable enough under WAL.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -8000)),  # Negative values are KiB
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+SERVER_DATA_COLUMNS = ('role_id', 'channel_id', 'log_channel_id', 'youtube_channel_id', 'youtube_role_id')
+
+
+@contextmanager
+def _timed(operation):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.sqlite_query_seconds.labels(operation).observe(time.perf_counter() - start)
+        metrics.sqlite_queries_total.labels(operation).inc()
+
+
+class Database:
+    """A small pool of long-lived SQLite connections.
+
+    Connections are opened lazily, up to pool_size, and handed out one caller
+    at a time. They run in autocommit mode, so a single statement commits on
+    its own; use transaction() to group several statements into one atomic
+    round-trip. Statements are reused through sqlite3's per-connection
+    statement cache, so queries should be passed as constant SQL text.
+    """
+
+    def __init__(self, path=DB_PATH, pool_size=POOL_SIZE, **pragmas):
+        self.path = path
+        self.pool_size = pool_size
+        self.pragmas = {**DEFAULT_PRAGMAS, **pragmas}
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._all = []
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+        return self._pool.get()
+
+    def _release(self, conn):
+        self._pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, or reuse this thread's open transaction."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements as one atomic transaction.
+
+        Storage functions called inside the block join the transaction.
+        Nested transaction() blocks join the outermost one.
+        """
+        if getattr(self._local, 'conn', None) is not None:
+            yield self._local.conn
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.after_commit = []
+        try:
+            with _timed('transaction'):
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+                callbacks = self._local.after_commit
+        finally:
+            self._local.conn = None
+            self._local.after_commit = []
+            self._release(conn)
+        for callback in callbacks:
+            callback()
+
+    def after_commit(self, callback):
+        """Run callback once the current transaction commits, or now if there is none.
+
+        Callbacks of a rolled-back transaction are dropped.
+        """
+        if getattr(self._local, 'conn', None) is not None:
+            self._local.after_commit.append(callback)
+        else:
+            callback()
+
+    def execute(self, query, params=()):
+        """Run a write statement and return the number of affected rows."""
+        with self.connection() as conn, _timed('execute'):
+            return conn.execute(query, params).rowcount
+
+    def executemany(self, query, seq_of_params):
+        with self.connection() as conn, _timed('executemany'):
+            return conn.executemany(query, seq_of_params).rowcount
+
+    def fetchone(self, query, params=()):
+        with self.connection() as conn, _timed('fetchone'):
+            return conn.execute(query, params).fetchone()
+
+    def fetchall(self, query, params=()):
+        with self.connection() as conn, _timed('fetchall'):
+            return conn.execute(query, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._created = 0
+            self._pool = queue.LifoQueue()
+
+
+GuildConfig = namedtuple('GuildConfig', ['server_data', 'streamers', 'youtubers'])
+
+
+class GuildConfigCache:
+    """Bounded LRU cache of per-guild config, keyed by guild_id.
+
+    Each entry holds the guild's server_data row (None if it has none), its
+    streamer list and its YouTube subscriptions. Writers update entries in place once their write has
+    committed. A load that raced with a write is discarded rather than cached,
+    so a reader cannot put back a value older than the latest write.
+    """
+
+    def __init__(self, maxsize=GUILD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, guild_id):
+        """Return (entry, version); entry is None on a miss."""
+        key = str(guild_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry, self._version
+
+    def put(self, guild_id, entry, version=None):
+        """Cache an entry loaded from the database at the given version."""
+        key = str(guild_id)
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, guild_id, func):
+        """Apply func to the cached entry, if any, after a committed write."""
+        key = str(guild_id)
+        with self._lock:
+            self._version += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = func(entry)
+
+    @property
+    def version(self):
+        """Goes up with every committed write and invalidation, so callers can tell when config changed."""
+        return self._version
+
+    def invalidate(self, guild_id=None):
+        """Drop one guild's entry, or every entry if guild_id is None."""
+        with self._lock:
+            self._version += 1
+            if guild_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(guild_id), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class SeenReleaseIndex:
+    """Which YouTube videos each guild has already been told about.
+
+    The youtube_seen table is the record; each (guild, channel) pair's ids are
+    loaded into an in-memory set on first use, so checks don't touch SQLite.
+    A pair with no rows has never been synced.
+    """
+
+    def __init__(self):
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def _ids(self, guild_id, channel):
+        key = (str(guild_id), channel)
+        ids = self._seen.get(key)
+        if ids is None:
+            rows = db.fetchall('SELECT video_id FROM youtube_seen WHERE guild_id = ? AND channel = ?', key)
+            with self._lock:
+                ids = self._seen.setdefault(key, {row[0] for row in rows})
+        return ids
+
+    def is_seeded(self, guild_id, channel):
+        return bool(self._ids(guild_id, channel))
+
+    def filter_new(self, guild_id, channel, video_ids):
+        """Return the video ids not yet seen, keeping their order."""
+        seen = self._ids(guild_id, channel)
+        return [video_id for video_id in video_ids if video_id not in seen]
+
+    def mark_seen(self, guild_id, channel, video_ids):
+        if not video_ids:
+            return
+        key = (str(guild_id), channel)
+        db.executemany(
+            'INSERT INTO youtube_seen (guild_id, channel, video_id) VALUES (?, ?, ?) ON CONFLICT DO NOTHING',
+            [key + (video_id,) for video_id in video_ids]
         )
-    ''')
-    
-    conn.commit()
-    conn.close()
+
+        def apply():
+            with self._lock:
+                self._seen.setdefault(key, set()).update(video_ids)
+        db.after_commit(apply)
+
+    def reset(self, guild_id=None):
+        """Drop a guild's loaded ids, or everyone's, so they are read from the table again on next use."""
+        with self._lock:
+            if guild_id is None:
+                self._seen.clear()
+                return
+            for key in [key for key in self._seen if key[0] == str(guild_id)]:
+                del self._seen[key]
+
+    def forget(self, guild_id, channel):
+        """Drop a pair's history, so a later resubscribe seeds again instead of reposting."""
+        key = (str(guild_id), channel)
+        db.execute('DELETE FROM youtube_seen WHERE guild_id = ? AND channel = ?', key)
+
+        def apply():
+            with self._lock:
+                self._seen.pop(key, None)
+        db.after_commit(apply)
+
+
+class LiveStateStore:
+    """Which Twitch stream each guild was last told about, per streamer.
+
+    The live_state table holds one row per (guild, streamer) that is live
+    and announced, with the Helix stream id. load() reads it once at
+    startup; after that checks are in memory. Changes are buffered and
+    written together by flush(), once per poll cycle. A stream is announced
+    again only if its id changed, so restarting mid-stream stays quiet.
+    """
+
+    def __init__(self):
+        self._state = {}  # (guild_id, lowercased streamer) -> stream id, '' if unknown
+        self._pending = {}  # Same keys -> stream id to write, or None to delete
+        self._lock = threading.Lock()
+
+    def load(self):
+        rows = db.fetchall('SELECT guild_id, streamer, stream_id FROM live_state')
+        with self._lock:
+            self._state = {(row[0], row[1]): row[2] for row in rows}
+            self._pending.clear()
+        return len(rows)
+
+    def reload(self, guild_id=None):
+        """Re-read one guild's rows, or every row, keeping changes not yet flushed."""
+        if guild_id is None:
+            rows = db.fetchall('SELECT guild_id, streamer, stream_id FROM live_state')
+        else:
+            guild_id = str(guild_id)
+            rows = [(guild_id,) + tuple(row) for row in
+                    db.fetchall('SELECT streamer, stream_id FROM live_state WHERE guild_id = ?', (guild_id,))]
+        with self._lock:
+            state = {key: stream_id for key, stream_id in self._state.items() if guild_id is not None and key[0] != guild_id}
+            state.update(((row[0], row[1]), row[2]) for row in rows)
+            for key, stream_id in self._pending.items():
+                if guild_id is not None and key[0] != guild_id:
+                    continue
+                if stream_id is None:
+                    state.pop(key, None)
+                else:
+                    state[key] = stream_id
+            self._state = state
+
+    def should_announce(self, guild_id, streamer, stream_id):
+        key = (str(guild_id), streamer.lower())
+        announced = self._state.get(key)
+        return announced is None or bool(stream_id and announced and announced != stream_id)
+
+    def is_live(self, guild_id, streamer):
+        return (str(guild_id), streamer.lower()) in self._state
+
+    def mark_live(self, guild_id, streamer, stream_id):
+        key = (str(guild_id), streamer.lower())
+        with self._lock:
+            self._state[key] = self._pending[key] = stream_id or ''
+
+    def mark_offline(self, guild_id, streamer):
+        key = (str(guild_id), streamer.lower())
+        with self._lock:
+            if self._state.pop(key, None) is not None:
+                self._pending[key] = None
+
+    def flush(self):
+        """Write buffered changes in one transaction; returns how many were written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with db.transaction() as conn:
+                conn.executemany(
+                    'INSERT INTO live_state (guild_id, streamer, stream_id) VALUES (?, ?, ?) '
+                    'ON CONFLICT(guild_id, streamer) DO UPDATE SET stream_id = excluded.stream_id',
+                    [key + (stream_id,) for key, stream_id in pending.items() if stream_id is not None]
+                )
+                conn.executemany('DELETE FROM live_state WHERE guild_id = ? AND streamer = ?',
+                                 [key for key, stream_id in pending.items() if stream_id is None])
+        except sqlite3.Error:
+            # Keep the changes for the next flush, unless they were superseded meanwhile
+            with self._lock:
+                for key, stream_id in pending.items():
+                    self._pending.setdefault(key, stream_id)
+            raise
+        return len(pending)
+
+    def forget(self, guild_id, streamer):
+        """Drop a streamer's state for a guild, e.g. when it stops following them."""
+        key = (str(guild_id), streamer.lower())
+        db.execute('DELETE FROM live_state WHERE guild_id = ? AND streamer = ?', key)
+
+        def apply():
+            with self._lock:
+                self._state.pop(key, None)
+                self._pending.pop(key, None)
+        db.after_commit(apply)
+
+
+db = Database()
+guild_cache = GuildConfigCache()
+seen_releases = SeenReleaseIndex()
+live_state = LiveStateStore()
+guild_change_listeners = []  # Called with the guild id after each committed config change
+
+
+def configure_database(path=DB_PATH, pool_size=POOL_SIZE, **pragmas):
+    """Replace the shared database, e.g. to point at another file or tune pragmas."""
+    global db
+    db.close()
+    db = Database(path, pool_size, **pragmas)
+    return db
+
+
+def init_db():
+    with db.transaction() as conn:
+        # Create server_data table if it doesn't exist
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS server_data (
+                guild_id TEXT PRIMARY KEY,
+                role_id INTEGER,
+                channel_id INTEGER,
+                log_channel_id INTEGER,
+                youtube_channel_id INTEGER,
+                youtube_role_id INTEGER
+            )
+        ''')
+
+        # Create streamers table if it doesn't exist
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS streamers (
+                guild_id TEXT,
+                streamer_name TEXT,
+                PRIMARY KEY (guild_id, streamer_name)
+            )
+        ''')
+
+        # One row per followed YouTube channel, indexed both ways so the poller
+        # can find every guild subscribed to a channel
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS youtube_subscriptions (
+                guild_id TEXT,
+                channel TEXT,
+                PRIMARY KEY (guild_id, channel)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_youtube_subscriptions_channel ON youtube_subscriptions (channel, guild_id)')
+
+        # Video ids already announced (or seeded) per guild and YouTube channel
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS youtube_seen (
+                guild_id TEXT,
+                channel TEXT,
+                video_id TEXT,
+                PRIMARY KEY (guild_id, channel, video_id)
+            ) WITHOUT ROWID
+        ''')
+
+        # Streams already announced per guild, so a restart doesn't announce them again
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS live_state (
+                guild_id TEXT,
+                streamer TEXT,
+                stream_id TEXT NOT NULL,
+                PRIMARY KEY (guild_id, streamer)
+            ) WITHOUT ROWID
+        ''')
+
+        # Resolved channel id and feed cache validators per YouTube handle
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS youtube_channels (
+                handle TEXT PRIMARY KEY,
+                channel_id TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            )
+        ''')
+
+        # Instances sharing the poll workload, and which of them holds each partition
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS poll_instances (
+                instance_id TEXT PRIMARY KEY,
+                heartbeat_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS poll_leases (
+                shard INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+
+        # Live streams as last seen by the instance polling them, for the others to show
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS live_streams (
+                login TEXT PRIMARY KEY,
+                title TEXT,
+                category TEXT,
+                started_at TEXT,
+                checked_at REAL NOT NULL
+            )
+        ''')
+
+        # Guild config changes, so other instances can drop their cached copies
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS guild_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id TEXT NOT NULL,
+                instance_id TEXT NOT NULL,
+                changed_at REAL NOT NULL
+            )
+        ''')
     print("Database initialized successfully.")
 
 def migrate_db():
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-
-    # Check if youtube_channel_id column exists
-    cursor.execute("PRAGMA table_info(server_data)")
-    columns = [column[1] for column in cursor.fetchall()]
-
-    if 'youtube_channel_id' not in columns:
-        cursor.execute('ALTER TABLE server_data ADD COLUMN youtube_channel_id INTEGER')
-    if 'youtube_role_id' not in columns:
-        cursor.execute('ALTER TABLE server_data ADD COLUMN youtube_role_id INTEGER')
-    if 'youtube_channel' not in columns:
-        cursor.execute('ALTER TABLE server_data ADD COLUMN youtube_channel TEXT')
-
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        # Check if youtube_channel_id column exists
+        columns = [column[1] for column in conn.execute("PRAGMA table_info(server_data)").fetchall()]
+
+        if 'youtube_channel_id' not in columns:
+            conn.execute('ALTER TABLE server_data ADD COLUMN youtube_channel_id INTEGER')
+        if 'youtube_role_id' not in columns:
+            conn.execute('ALTER TABLE server_data ADD COLUMN youtube_role_id INTEGER')
+
+        # Move comma-joined server_data.youtube_channel values into youtube_subscriptions.
+        # The legacy column is left in place but emptied, so this only runs once.
+        if 'youtube_channel' in columns:
+            rows = conn.execute("SELECT guild_id, youtube_channel FROM server_data WHERE youtube_channel IS NOT NULL AND youtube_channel != ''").fetchall()
+            conn.executemany(
+                'INSERT INTO youtube_subscriptions (guild_id, channel) VALUES (?, ?) ON CONFLICT(guild_id, channel) DO NOTHING',
+                [(guild_id, channel.strip()) for guild_id, joined in rows for channel in joined.split(',') if channel.strip()]
+            )
+            conn.execute('UPDATE server_data SET youtube_channel = NULL')
+            if rows:
+                print(f"Migrated YouTube channels for {len(rows)} guild(s) to youtube_subscriptions.")
     print("Database migration completed successfully.")
 
+def _row_to_server_data(row):
+    return dict(zip(SERVER_DATA_COLUMNS, row))
+
+def _load_guild_config(guild_id):
+    row = db.fetchone('SELECT role_id, channel_id, log_channel_id, youtube_channel_id, youtube_role_id FROM server_data WHERE guild_id = ?', (guild_id,))
+    streamers = db.fetchall('SELECT streamer_name FROM streamers WHERE guild_id = ?', (guild_id,))
+    youtubers = db.fetchall('SELECT channel FROM youtube_subscriptions WHERE guild_id = ?', (guild_id,))
+    return GuildConfig(_row_to_server_data(row) if row else None, tuple(r[0] for r in streamers), tuple(r[0] for r in youtubers))
+
+def _guild_config(guild_id):
+    entry, version = guild_cache.get(guild_id)
+    if entry is None:
+        entry = _load_guild_config(guild_id)
+        guild_cache.put(guild_id, entry, version)
+    return entry
+
+def _after_guild_write(guild_id, apply):
+    """Once the current write commits, update the cached entry and tell guild_change_listeners."""
+    def committed():
+        guild_cache.update(guild_id, apply)
+        for listener in guild_change_listeners:
+            listener(guild_id)
+    db.after_commit(committed)
+
+def reload_guild(guild_id):
+    """Drop what this process holds in memory about a guild, after another process changed it."""
+    guild_cache.invalidate(guild_id)
+    seen_releases.reset(guild_id)
+    live_state.reload(guild_id)
+
+def _update_server_data(guild_id, **values):
+    def apply(entry):
+        server_data = entry.server_data or dict.fromkeys(SERVER_DATA_COLUMNS)
+        return entry._replace(server_data={**server_data, **values})
+    _after_guild_write(guild_id, apply)
+
+def load_guild_cache():
+    """Fill the guild config cache from the database in three queries."""
+    entries = {}
+    for row in db.fetchall('SELECT guild_id, role_id, channel_id, log_channel_id, youtube_channel_id, youtube_role_id FROM server_data'):
+        entries[str(row[0])] = [_row_to_server_data(row[1:]), [], []]
+    for guild_id, streamer_name in db.fetchall('SELECT guild_id, streamer_name FROM streamers'):
+        entries.setdefault(str(guild_id), [None, [], []])[1].append(streamer_name)
+    for guild_id, channel in db.fetchall('SELECT guild_id, channel FROM youtube_subscriptions'):
+        entries.setdefault(str(guild_id), [None, [], []])[2].append(channel)
+    guild_cache.invalidate()
+    for guild_id, (server_data, streamers, youtubers) in list(entries.items())[:guild_cache.maxsize]:
+        guild_cache.put(guild_id, GuildConfig(server_data, tuple(streamers), tuple(youtubers)))
+    print(f"Loaded {min(len(entries), guild_cache.maxsize)} guild config(s) into cache.")
+
 def get_server_data(guild_id):
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT role_id, channel_id, log_channel_id, youtube_channel_id, youtube_role_id, youtube_channel FROM server_data WHERE guild_id = ?', (guild_id,))
-    result = cursor.fetchone()
-    conn.close()
-    if result:
-        return {
-            'role_id': result[0],
-            'channel_id': result[1],
-            'log_channel_id': result[2],
-            'youtube_channel_id': result[3],
-            'youtube_role_id': result[4],
-            'youtube_channel': result[5]
-        }
-    return None
+    server_data = _guild_config(guild_id).server_data
+    # Hand out a copy so callers can't modify the cached entry
+    return dict(server_data) if server_data is not None else None
 
 def set_server_data(guild_id, **kwargs):
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    
-    # Check if the guild_id already exists
-    cursor.execute('SELECT 1 FROM server_data WHERE guild_id = ?', (guild_id,))
-    exists = cursor.fetchone()
-    
-    if exists:
-        # Update existing record
-        set_clause = ', '.join([f'{k} = ?' for k in kwargs.keys()])
-        query = f'UPDATE server_data SET {set_clause} WHERE guild_id = ?'
-        cursor.execute(query, list(kwargs.values()) + [guild_id])
-    else:
-        # Insert new record
-        columns = ['guild_id'] + list(kwargs.keys())
-        placeholders = '?' * (len(columns))
-        query = f'INSERT INTO server_data ({", ".join(columns)}) VALUES ({", ".join(placeholders)})'
-        cursor.execute(query, [guild_id] + list(kwargs.values()))
-    
-    conn.commit()
-    conn.close()
+    unknown = set(kwargs) - set(SERVER_DATA_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown server_data column(s): {', '.join(sorted(unknown))}")
+    if not kwargs:
+        db.execute('INSERT INTO server_data (guild_id) VALUES (?) ON CONFLICT(guild_id) DO NOTHING', (guild_id,))
+        _update_server_data(guild_id)
+        return
+
+    # Insert or update in a single statement
+    columns = ['guild_id'] + list(kwargs.keys())
+    placeholders = ', '.join('?' * len(columns))
+    updates = ', '.join(f'{k} = excluded.{k}' for k in kwargs.keys())
+    query = f'INSERT INTO server_data ({", ".join(columns)}) VALUES ({placeholders}) ON CONFLICT(guild_id) DO UPDATE SET {updates}'
+    db.execute(query, [guild_id] + list(kwargs.values()))
+    _update_server_data(guild_id, **kwargs)
 
 def add_streamer(guild_id, streamer_name):
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+    db.execute('''
         INSERT INTO streamers (guild_id, streamer_name)
         VALUES (?, ?)
         ON CONFLICT(guild_id, streamer_name) DO NOTHING
     ''', (guild_id, streamer_name))
-    conn.commit()
-    conn.close()
+
+    def apply(entry):
+        if streamer_name in entry.streamers:
+            return entry
+        return entry._replace(streamers=entry.streamers + (streamer_name,))
+    _after_guild_write(guild_id, apply)
 
 def remove_streamer(guild_id, streamer_name):
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM streamers WHERE guild_id = ? AND streamer_name = ?', (guild_id, streamer_name))
-    conn.commit()
-    conn.close()
+    db.execute('DELETE FROM streamers WHERE guild_id = ? AND streamer_name = ?', (guild_id, streamer_name))
+    live_state.forget(guild_id, streamer_name)
+
+    def apply(entry):
+        return entry._replace(streamers=tuple(s for s in entry.streamers if s != streamer_name))
+    _after_guild_write(guild_id, apply)
 
 def get_streamers(guild_id):
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT streamer_name FROM streamers WHERE guild_id = ?', (guild_id,))
-    streamers = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return streamers
+    return list(_guild_config(guild_id).streamers)
+
+def get_tracked_streamers():
+    """Retrieve every streamer followed by at least one guild, lowercased and deduplicated."""
+    return [row[0] for row in db.fetchall('SELECT DISTINCT lower(streamer_name) FROM streamers')]
 
 def get_all_guild_ids():
     """Retrieve all unique guild IDs from the server_data table."""
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT DISTINCT guild_id FROM server_data')
-    guild_ids = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return guild_ids
+    return [row[0] for row in db.fetchall('SELECT DISTINCT guild_id FROM server_data')]
 
 def get_youtube_settings(guild_id):
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT youtube_channel_id, youtube_role_id, youtube_channel FROM server_data WHERE guild_id = ?', (guild_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return result if result else (None, None, None)
-
-def set_youtube_settings(guild_id, youtube_channel_id, youtube_role_id, youtube_channel):
-    set_server_data(guild_id, youtube_channel_id=youtube_channel_id, youtube_role_id=youtube_role_id, youtube_channel=youtube_channel)
-    
+    """Return the (youtube_channel_id, youtube_role_id) a guild's releases are posted with."""
+    server_data = _guild_config(guild_id).server_data
+    if server_data is None:
+        return (None, None)
+    return (server_data['youtube_channel_id'], server_data['youtube_role_id'])
+
+def set_youtube_settings(guild_id, youtube_channel_id, youtube_role_id):
+    set_server_data(guild_id, youtube_channel_id=youtube_channel_id, youtube_role_id=youtube_role_id)
+
 def get_youtubers(guild_id):
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT youtube_channel FROM server_data WHERE guild_id = ?', (guild_id,))
-    result = cursor.fetchone()
-    conn.close()
-    if result and result[0]:
-        return result[0].split(',')
-    return []
+    return list(_guild_config(guild_id).youtubers)
 
 def add_youtuber(guild_id, channel_name):
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    
-    # Get current YouTube channels
-    cursor.execute('SELECT youtube_channel FROM server_data WHERE guild_id = ?', (guild_id,))
-    result = cursor.fetchone()
-    
-    if result and result[0]:
-        channels = result[0].split(',')
-        if channel_name not in channels:
-            channels.append(channel_name)
-            new_channels = ','.join(channels)
-    else:
-        new_channels = channel_name
-    
-    # Update the YouTube channels
-    cursor.execute('UPDATE server_data SET youtube_channel = ? WHERE guild_id = ?', (new_channels, guild_id))
-    
-    # If no rows were updated, insert a new row
-    if cursor.rowcount == 0:
-        cursor.execute('INSERT INTO server_data (guild_id, youtube_channel) VALUES (?, ?)', (guild_id, new_channels))
-    
-    conn.commit()
-    conn.close()
+    """Subscribe a guild to a YouTube channel. Returns False if it already was."""
+    added = db.execute('''
+        INSERT INTO youtube_subscriptions (guild_id, channel)
+        VALUES (?, ?)
+        ON CONFLICT(guild_id, channel) DO NOTHING
+    ''', (guild_id, channel_name)) > 0
+
+    def apply(entry):
+        if channel_name in entry.youtubers:
+            return entry
+        return entry._replace(youtubers=entry.youtubers + (channel_name,))
+    if added:
+        _after_guild_write(guild_id, apply)
+    return added
 
 def remove_youtuber(guild_id, channel_name):
-    conn = sqlite3.connect('server_data.db')
-    cursor = conn.cursor()
-    
-    # Get current YouTube channels
-    cursor.execute('SELECT youtube_channel FROM server_data WHERE guild_id = ?', (guild_id,))
-    result = cursor.fetchone()
-    
-    if result and result[0]:
-        channels = result[0].split(',')
-        if channel_name in channels:
-            channels.remove(channel_name)
-            new_channels = ','.join(channels) if channels else None
-            
-            # Update the YouTube channels
-            cursor.execute('UPDATE server_data SET youtube_channel = ? WHERE guild_id = ?', (new_channels, guild_id))
-    
-    conn.commit()
-    conn.close()
-    
+    """Unsubscribe a guild from a YouTube channel. Returns False if it wasn't subscribed."""
+    with db.transaction():
+        removed = db.execute('DELETE FROM youtube_subscriptions WHERE guild_id = ? AND channel = ?', (guild_id, channel_name)) > 0
+        seen_releases.forget(guild_id, channel_name)
+
+    def apply(entry):
+        return entry._replace(youtubers=tuple(c for c in entry.youtubers if c != channel_name))
+    if removed:
+        _after_guild_write(guild_id, apply)
+    return removed
+
+def get_youtube_subscriptions():
+    """Map each followed YouTube channel to the guild IDs subscribed to it."""
+    subscriptions = {}
+    for channel, guild_id in db.fetchall('SELECT channel, guild_id FROM youtube_subscriptions ORDER BY channel'):
+        subscriptions.setdefault(channel, []).append(guild_id)
+    return subscriptions
+
+def get_youtube_subscribers(channel_name):
+    """Retrieve the guild IDs subscribed to one YouTube channel."""
+    return [row[0] for row in db.fetchall('SELECT guild_id FROM youtube_subscriptions WHERE channel = ?', (channel_name,))]
+
+def get_youtube_channel(handle):
+    """Return (channel_id, etag, last_modified) for a resolved handle, or None."""
+    return db.fetchone('SELECT channel_id, etag, last_modified FROM youtube_channels WHERE handle = ?', (handle,))
+
+def set_youtube_channel(handle, channel_id):
+    db.execute('''
+        INSERT INTO youtube_channels (handle, channel_id) VALUES (?, ?)
+        ON CONFLICT(handle) DO UPDATE SET channel_id = excluded.channel_id, etag = NULL, last_modified = NULL
+    ''', (handle, channel_id))
+
+def set_youtube_feed_validators(handle, etag, last_modified):
+    db.execute('UPDATE youtube_channels SET etag = ?, last_modified = ? WHERE handle = ?', (etag, last_modified, handle))
+
 def get_all_streamers(guild_id):
     twitch_streamers = get_streamers(guild_id)
     youtube_channels = get_youtubers(guild_id)
     return twitch_streamers + youtube_channels
 
+def heartbeat_instance(instance_id, now, ttl):
+    """Record that an instance is alive, forget instances silent for ttl seconds, and return the live ids sorted."""
+    db.execute('''
+        INSERT INTO poll_instances (instance_id, heartbeat_at) VALUES (?, ?)
+        ON CONFLICT(instance_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+    ''', (instance_id, now))
+    db.execute('DELETE FROM poll_instances WHERE heartbeat_at < ?', (now - ttl,))
+    return [row[0] for row in db.fetchall('SELECT instance_id FROM poll_instances ORDER BY instance_id')]
+
+def claim_leases(instance_id, shards, now, expires_at):
+    """Take or renew the leases on shards that are free, expired or already ours; returns every shard we hold."""
+    db.executemany('''
+        INSERT INTO poll_leases (shard, owner, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(shard) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE poll_leases.owner = excluded.owner OR poll_leases.expires_at <= ?
+    ''', [(shard, instance_id, expires_at, now) for shard in shards])
+    return {row[0] for row in db.fetchall('SELECT shard FROM poll_leases WHERE owner = ? AND expires_at > ?', (instance_id, now))}
+
+def release_leases(instance_id, shards=None):
+    """Give up the given shards, or all of an instance's shards if shards is None."""
+    if shards is None:
+        db.execute('DELETE FROM poll_leases WHERE owner = ?', (instance_id,))
+    elif shards:
+        db.executemany('DELETE FROM poll_leases WHERE shard = ? AND owner = ?', [(shard, instance_id) for shard in shards])
+
+def remove_instance(instance_id):
+    db.execute('DELETE FROM poll_instances WHERE instance_id = ?', (instance_id,))
+
+def save_live_streams(changes, checked_at):
+    """Write live status changes: login -> stream info, or None once the stream ended."""
+    with db.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO live_streams (login, title, category, started_at, checked_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(login) DO UPDATE SET title = excluded.title, category = excluded.category,
+                started_at = excluded.started_at, checked_at = excluded.checked_at
+        ''', [(login, info['title'], info['category'], info.get('started_at'), checked_at)
+              for login, info in changes.items() if info])
+        conn.executemany('DELETE FROM live_streams WHERE login = ?', [(login,) for login, info in changes.items() if not info])
+
+def get_live_streams(since):
+    """Return {login: stream info} for streams seen live at or after since."""
+    rows = db.fetchall('SELECT login, title, category, started_at FROM live_streams WHERE checked_at >= ?', (since,))
+    return {row[0]: {'title': row[1], 'category': row[2], 'started_at': row[3]} for row in rows}
+
+def prune_live_streams(before):
+    db.execute('DELETE FROM live_streams WHERE checked_at < ?', (before,))
+
+def record_guild_change(guild_id, instance_id, now):
+    db.execute('INSERT INTO guild_changes (guild_id, instance_id, changed_at) VALUES (?, ?, ?)', (str(guild_id), instance_id, now))
+
+def get_guild_changes(after_seq, instance_id):
+    """Return (seq, guild_id) for changes made by other instances after after_seq, oldest first."""
+    return db.fetchall('SELECT seq, guild_id FROM guild_changes WHERE seq > ? AND instance_id != ? ORDER BY seq',
+                       (after_seq, instance_id))
+
+def get_last_guild_change():
+    return db.fetchone('SELECT COALESCE(MAX(seq), 0) FROM guild_changes')[0]
+
+def prune_guild_changes(before):
+    db.execute('DELETE FROM guild_changes WHERE changed_at < ?', (before,))
+
+_setup_done = False
+
 def setup_database():
+    """Create the schema, migrate old data and warm the guild cache, once per process."""
+    global _setup_done
+    if _setup_done:
+        return
     init_db()
-    migrate_db()
\ No newline at end of file
+    migrate_db()
+    load_guild_cache()
+    _setup_done = True
@@ -0,0 +1,34 @@
+"""StreamGuard command line.
+
+    python -m streamguard serve   Run the bot, poller and web endpoints headless
+    python -m streamguard gui     Run with the desktop GUI (needs PyQt6)
+"""
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+
+def serve(args):
+    import bot
+    bot.serve()
+
+
+def gui(args):
+    import bot
+    bot.main()
+
+
+def main(argv=None):
+    # Before anything else is imported, since several modules read settings at import time
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog='streamguard', description="Twitch and YouTube notifications for Discord")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    subcommands.add_parser('serve', help="Run headless: bot, poller and web endpoints, no Qt").set_defaults(func=serve)
+    subcommands.add_parser('gui', help="Run with the desktop GUI").set_defaults(func=gui)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
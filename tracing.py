@@ -0,0 +1,122 @@
+import contextvars
+import cProfile
+import logging
+import os
+import random
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', 50))  # Cycle traces kept for inspection
+SLOW_CYCLE_SECONDS = float(os.getenv('SLOW_CYCLE_SECONDS', 10))
+# Debug switch: sampled cProfile captures of slow cycles, and the /debug/traces endpoint
+DEBUG_ENABLED = os.getenv('STREAMGUARD_DEBUG', '').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.1))  # Fraction of cycles run under cProfile
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+# start is seconds since the trace began; parent is the index of the enclosing span, or -1
+Span = namedtuple('Span', 'name parent start duration attrs')
+
+_current = contextvars.ContextVar('current_span', default=None)  # (trace, index of the active span)
+_recent = deque(maxlen=TRACE_BUFFER_SIZE)
+_profiling = False
+
+
+class Trace:
+    """The spans recorded during one cycle, in the order they started."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = []  # A None entry is a span that is still running
+        self.keep = True  # Cleared by the caller for cycles not worth recording
+        self.profile_path = None
+        self._start = time.perf_counter()
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration': self.duration,
+            'profile': self.profile_path,
+            'spans': [span._asdict() for span in self.spans if span is not None],
+        }
+
+    def format(self):
+        """Render the spans as an indented tree, one line per span."""
+        depth = {-1: 0}
+        lines = [f"{self.name} {self.duration or 0:.3f}s"]
+        for index, span in enumerate(self.spans):
+            if span is None:
+                continue
+            depth[index] = depth.get(span.parent, 0) + 1
+            attrs = ''.join(f" {key}={value}" for key, value in span.attrs.items())
+            lines.append(f"{'  ' * depth[index]}{span.name} +{span.start:.3f}s {span.duration:.3f}s{attrs}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the enclosed block as a child of the active span. A no-op outside a traced cycle.
+
+    Tasks started inside the block (e.g. by asyncio.gather) inherit it as
+    their parent, so concurrent work shows up side by side.
+    """
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    trace, parent = current
+    index = len(trace.spans)
+    trace.spans.append(None)
+    start = time.perf_counter()
+    token = _current.set((trace, index))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        trace.spans[index] = Span(name, parent, round(start - trace._start, 6),
+                                  round(time.perf_counter() - start, 6), attrs)
+
+
+@contextmanager
+def trace_cycle(name):
+    """Trace one cycle and keep it in the ring buffer.
+
+    Slow cycles are logged with their span tree. With the debug switch on,
+    a sample of cycles also runs under cProfile, and the profile is written
+    to PROFILE_DIR if the cycle turns out slow.
+    """
+    global _profiling
+    trace = Trace(name)
+    profiler = None
+    if DEBUG_ENABLED and not _profiling and random.random() < PROFILE_SAMPLE_RATE:
+        _profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+    token = _current.set((trace, -1))
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        trace.duration = round(time.perf_counter() - trace._start, 6)
+        if profiler is not None:
+            profiler.disable()
+            _profiling = False
+        if trace.keep:
+            slow = trace.duration >= SLOW_CYCLE_SECONDS
+            if slow and profiler is not None:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                trace.profile_path = os.path.join(PROFILE_DIR, f"{name}-{int(trace.started_at * 1000)}.prof")
+                profiler.dump_stats(trace.profile_path)
+            _recent.append(trace)
+            if slow:
+                logger.warning(f"Slow {name} took {trace.duration:.2f}s:\n{trace.format()}")
+
+
+def recent_traces():
+    """Return the buffered cycle traces, oldest first."""
+    return list(_recent)
@@ -0,0 +1,334 @@
+"""Runs the poller in separate worker processes.
+
+With POLL_WORKERS set, the bot process keeps the Discord gateway, the
+EventSub webhook and the notification dispatcher, and PollerSupervisor
+starts that many workers. Each worker runs monitor_streams over its
+partition of the streamers and YouTube channels, reading subscriptions
+from the shared SQLite database. Workers and the bot talk over one pipe
+per worker, sending tuples whose first item names the message:
+
+    worker -> bot   ('notify', seq, channel_id, message, role_id)
+                    ('status', changes, checked_at)
+                    ('log', record)
+    bot -> worker   ('delivered', seq, result)
+                    ('stream_event', login, online, started_at, stream_id)
+                    ('guild_changed', guild_id)
+                    ('eventsub_active', active)
+                    ('partitions', owned, count)
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from logging.handlers import QueueHandler
+
+import app
+import live_status
+import metrics
+import storage
+from logging_setup import LOG_LEVEL
+from notifier import DeliveryResult
+from ratelimit import backoff_delay
+from scheduler import partition_of
+
+POLL_WORKERS = int(os.getenv('POLL_WORKERS', 0))  # 0 polls on the bot's own event loop
+SUPERVISE_INTERVAL = 1.0  # Seconds between liveness checks
+WORKER_STABLE_SECONDS = 60  # A worker up this long has its restart backoff reset
+WORKER_MAX_RESTART_DELAY = 60
+
+logger = logging.getLogger(__name__)
+
+workers_alive = metrics.Gauge('streamguard_poller_workers', 'Poller worker processes running.')
+worker_restarts_total = metrics.Counter('streamguard_poller_worker_restarts_total', 'Poller worker processes restarted after dying.')
+
+
+class _Channel:
+    """One end of a worker pipe; send() may be called from any thread."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        """Send a message, returning False if the other end has gone away."""
+        try:
+            with self._lock:
+                self.conn.send(message)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def read_forever(self, loop, handle):
+        """Hand every received message to handle on loop until the pipe closes. Runs in its own thread."""
+        try:
+            while True:
+                loop.call_soon_threadsafe(handle, self.conn.recv())
+        except (EOFError, OSError):
+            pass
+        except RuntimeError:
+            return  # The loop was closed
+        try:
+            loop.call_soon_threadsafe(handle, ('closed',))
+        except RuntimeError:
+            pass
+
+
+class _PipeQueue:
+    """Lets a QueueHandler put log records on a worker pipe."""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def put_nowait(self, record):
+        self.channel.send(('log', record))
+
+
+class RemoteDispatcher:
+    """Stands in for NotificationDispatcher inside a worker.
+
+    Notifications are sent to the bot process, which delivers them with
+    its own dispatcher and answers with the DeliveryResult. The error in
+    a result arrives as its message string.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self._seq = itertools.count()
+        self._futures = {}
+
+    def submit(self, channel_id, message, role_id=None):
+        future = asyncio.get_running_loop().create_future()
+        seq = next(self._seq)
+        self._futures[seq] = future
+        if not self.channel.send(('notify', seq, channel_id, message, role_id)):
+            self.resolve(seq, (int(channel_id), False, None, 'bot process unavailable', 0))
+        return future
+
+    def submit_many(self, deliveries):
+        return [self.submit(*delivery) for delivery in deliveries]
+
+    def pending(self):
+        return len(self._futures)
+
+    def resolve(self, seq, result):
+        future = self._futures.pop(seq, None)
+        if future is not None and not future.done():
+            future.set_result(DeliveryResult(*result))
+
+    async def drain(self):
+        while self._futures:
+            await asyncio.gather(*list(self._futures.values()), return_exceptions=True)
+
+
+async def _log_errors(coro, what):
+    try:
+        await coro
+    except Exception as e:
+        logger.error(f"Error handling {what}: {e}")
+
+
+def run_worker(conn, partitions, count):
+    """Entry point of a worker process: poll the given partitions of count until the bot process goes away."""
+    # Ctrl+C reaches the whole process group; the bot process decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    channel = _Channel(conn)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(_PipeQueue(channel)))
+    root.setLevel(LOG_LEVEL)
+
+    storage.setup_database()
+    app.init_live_state()
+    app.set_poll_partitions(partitions, count)
+    dispatcher = RemoteDispatcher(channel)
+    app.notification_dispatcher = dispatcher
+    live_status.add_listener(lambda changes, checked_at: channel.send(('status', changes, checked_at)))
+    asyncio.run(_worker_main(channel, dispatcher))
+
+
+async def _worker_main(channel, dispatcher):
+    loop = asyncio.get_running_loop()
+    closed = asyncio.Event()
+
+    def handle(message):
+        kind = message[0]
+        if kind == 'delivered':
+            dispatcher.resolve(message[1], message[2])
+        elif kind == 'stream_event':
+            loop.create_task(_log_errors(app.handle_stream_event(*message[1:]), 'EventSub event'))
+        elif kind == 'guild_changed':
+            storage.reload_guild(message[1])
+        elif kind == 'eventsub_active':
+            app.set_eventsub_active(message[1])
+        elif kind == 'partitions':
+            app.set_poll_partitions(message[1], message[2])
+        elif kind == 'closed':
+            closed.set()
+
+    threading.Thread(target=channel.read_forever, args=(loop, handle), name='worker-pipe', daemon=True).start()
+    poller = loop.create_task(app.monitor_streams())
+    await closed.wait()
+    # The bot process is gone; nobody is left to deliver notifications
+    poller.cancel()
+    try:
+        app.live_state.flush()
+    except Exception as e:
+        logger.error(f"Failed to save live state: {e}")
+
+
+class _Worker:
+    def __init__(self, index, process, channel):
+        self.index = index
+        self.process = process
+        self.channel = channel
+        self.started = time.monotonic()
+
+
+class PollerSupervisor:
+    """Runs the poller in `count` worker processes and restarts any that die.
+
+    Worker i polls the keys whose partition_of(key, count) is i, so each
+    streamer and YouTube channel is polled by exactly one worker. After
+    set_partitions() the workers split the given partitions between them
+    instead. The supervisor delivers the workers' notifications, applies
+    their live status changes to this process's snapshot and replays their
+    log records here. A worker that exits is restarted after a backoff that
+    grows while it keeps dying soon after starting.
+    """
+
+    def __init__(self, count, dispatcher=None):
+        self.count = count
+        self.dispatcher = dispatcher
+        self.restarts = 0
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = [None] * count
+        self._failures = [0] * count  # Consecutive quick deaths per worker
+        self._restart_at = [0.0] * count
+        self._eventsub_active = None
+        self._partitions = None  # (owned, count) this instance polls, None for all
+        self._loop = None
+        self._tasks = set()
+
+    def alive(self):
+        return sum(1 for worker in self._workers if worker is not None and worker.process.is_alive())
+
+    def _worker_partitions(self, index):
+        if self._partitions is None:
+            return frozenset([index]), self.count
+        owned, count = self._partitions
+        return frozenset(partition for partition in owned if partition % self.count == index), count
+
+    def _spawn(self, index):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=run_worker, args=(child_conn, *self._worker_partitions(index)),
+                                        name=f'poller-{index}', daemon=True)
+        process.start()
+        child_conn.close()
+        worker = _Worker(index, process, _Channel(parent_conn))
+        self._workers[index] = worker
+        if self._eventsub_active is not None:
+            worker.channel.send(('eventsub_active', self._eventsub_active))
+        threading.Thread(target=worker.channel.read_forever, args=(self._loop, lambda message: self._handle(worker, message)),
+                         name=f'poller-{index}-pipe', daemon=True).start()
+        logger.info(f"Started poller worker {index} (pid {process.pid})")
+
+    def _handle(self, worker, message):
+        kind = message[0]
+        if kind == 'notify':
+            task = self._loop.create_task(self._deliver(worker, *message[1:]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        elif kind == 'status':
+            live_status.publish(message[1], checked_at=message[2])
+        elif kind == 'log':
+            record = message[1]
+            logging.getLogger(record.name).handle(record)
+
+    async def _deliver(self, worker, seq, channel_id, message, role_id):
+        result = await self.dispatcher.submit(channel_id, message, role_id)
+        error = str(result.error) if result.error is not None else None
+        # Fails quietly if the worker died meanwhile; its replacement polls again
+        worker.channel.send(('delivered', seq, (result.channel_id, result.ok, result.status, error, result.attempts)))
+
+    def _check(self):
+        now = time.monotonic()
+        for index, worker in enumerate(self._workers):
+            if worker.process.is_alive():
+                continue
+            if not self._restart_at[index]:
+                if now - worker.started >= WORKER_STABLE_SECONDS:
+                    self._failures[index] = 0
+                delay = min(backoff_delay(self._failures[index]), WORKER_MAX_RESTART_DELAY)
+                self._failures[index] += 1
+                self._restart_at[index] = now + delay
+                logger.error(f"Poller worker {index} exited with code {worker.process.exitcode}, restarting in {delay:.1f}s")
+                worker.channel.conn.close()
+            elif now >= self._restart_at[index]:
+                self._restart_at[index] = 0.0
+                self.restarts += 1
+                worker_restarts_total.inc()
+                self._spawn(index)
+
+    async def run(self):
+        """Start the workers and keep them running. Must run on the bot's loop."""
+        self._loop = asyncio.get_running_loop()
+        if self.dispatcher is None:
+            self.dispatcher = app.notification_dispatcher
+        workers_alive.set_function(self.alive)
+        storage.guild_change_listeners.append(self.guild_changed)
+        for index in range(self.count):
+            self._spawn(index)
+        try:
+            while True:
+                await asyncio.sleep(SUPERVISE_INTERVAL)
+                self._check()
+        finally:
+            storage.guild_change_listeners.remove(self.guild_changed)
+            self.stop()
+
+    def stop(self):
+        for worker in self._workers:
+            if worker is not None and worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self._workers:
+            if worker is not None:
+                worker.process.join(timeout=5)
+
+    def _broadcast(self, message):
+        for worker in self._workers:
+            if worker is not None:
+                worker.channel.send(message)
+
+    def stream_event(self, login, online, started_at=None, stream_id=None):
+        """Pass an EventSub event to the worker that polls the login."""
+        if self._partitions is None:
+            worker = self._workers[partition_of(login.lower(), self.count)]
+        else:
+            owned, count = self._partitions
+            partition = partition_of(login.lower(), count)
+            if partition not in owned:
+                logger.debug("Ignoring EventSub event for %s, its partition is polled elsewhere", login)
+                return
+            worker = self._workers[partition % self.count]
+        if worker is None or not worker.channel.send(('stream_event', login, online, started_at, stream_id)):
+            logger.warning(f"Dropping EventSub event for {login}: its poller worker isn't running")
+
+    def guild_changed(self, guild_id):
+        """Tell every worker to reload a guild's config. Called from any thread after a committed change."""
+        self._broadcast(('guild_changed', guild_id))
+
+    def set_partitions(self, owned, count):
+        """Split the given partitions of count between the workers."""
+        self._partitions = (frozenset(owned), count)
+        for index, worker in enumerate(self._workers):
+            if worker is not None:
+                worker.channel.send(('partitions',) + self._worker_partitions(index))
+
+    def set_eventsub_active(self, active):
+        self._eventsub_active = active
+        self._broadcast(('eventsub_active', active))
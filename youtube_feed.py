@@ -0,0 +1,116 @@
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from http_client import HttpError
+from storage import get_youtube_channel, set_youtube_channel, set_youtube_feed_validators
+
+logger = logging.getLogger(__name__)
+
+YOUTUBE_BASE_URL = os.getenv('YOUTUBE_BASE_URL', "https://www.youtube.com")
+FEED_NAMESPACES = {
+    'atom': 'http://www.w3.org/2005/Atom',
+    'yt': 'http://www.youtube.com/xml/schemas/2015',
+}
+CHANNEL_ID_PATTERN = re.compile(r'^UC[\w-]{22}$')
+# Only the page's own metadata; a bare "channelId" or /channel/ link can belong to a featured or related channel
+CHANNEL_ID_IN_PAGE = re.compile(r'"externalId":"(UC[\w-]{22})"|<link rel="canonical" href="[^"]*/channel/(UC[\w-]{22})"')
+
+
+class YouTubeFeedFetcher:
+    """Fetches a channel's uploads from its Atom feed instead of scraping HTML.
+
+    Each handle is resolved to its channel id once, and the id is kept in
+    memory and in the youtube_channels table. Feed requests send the
+    previous ETag and Last-Modified back, so an unchanged channel costs a
+    304 and no parsing.
+    """
+
+    def __init__(self, http_session, base_url=YOUTUBE_BASE_URL):
+        self.http_session = http_session
+        self.base_url = base_url
+        self._channels = {}  # handle -> [channel_id, etag, last_modified]
+
+    def _cached(self, handle):
+        entry = self._channels.get(handle)
+        if entry is None:
+            row = get_youtube_channel(handle)
+            if row:
+                entry = self._channels[handle] = list(row)
+        return entry
+
+    async def resolve_channel_id(self, handle):
+        """Return the UC... channel id for a handle, looking it up only the first time."""
+        entry = self._cached(handle)
+        if entry:
+            return entry[0]
+        if CHANNEL_ID_PATTERN.match(handle):
+            channel_id = handle
+        else:
+            response = await self.http_session.get(f"{self.base_url}/@{handle}")
+            response.raise_for_status()
+            match = CHANNEL_ID_IN_PAGE.search(response.text)
+            if not match:
+                logger.error(f"Could not find a channel id on the page for YouTube handle {handle}")
+                return None
+            channel_id = match.group(1) or match.group(2)
+        set_youtube_channel(handle, channel_id)
+        self._channels[handle] = [channel_id, None, None]
+        logger.info(f"Resolved YouTube handle {handle} to channel {channel_id}")
+        return channel_id
+
+    async def fetch(self, handle, conditional=True):
+        """Return the channel's latest uploads, newest first.
+
+        Returns an empty list if the feed is unchanged since the last fetch,
+        and None if the channel can't be resolved or fetched. Pass
+        conditional=False to get the full feed even if it is unchanged.
+        """
+        try:
+            channel_id = await self.resolve_channel_id(handle)
+            if channel_id is None:
+                return None
+            entry = self._channels[handle]
+            headers = {}
+            if conditional and entry[1]:
+                headers['If-None-Match'] = entry[1]
+            if conditional and entry[2]:
+                headers['If-Modified-Since'] = entry[2]
+            response = await self.http_session.get(f"{self.base_url}/feeds/videos.xml",
+                                                   params={'channel_id': channel_id}, headers=headers)
+        except HttpError as e:
+            logger.error(f"Failed to fetch YouTube feed for channel {handle}: {e}")
+            return None
+
+        if response.status == 304:
+            return []
+        if response.status != 200:
+            logger.error(f"Failed to fetch YouTube feed for channel {handle}: HTTP {response.status}")
+            return None
+
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if (etag, last_modified) != (entry[1], entry[2]):
+            entry[1], entry[2] = etag, last_modified
+            set_youtube_feed_validators(handle, etag, last_modified)
+        try:
+            return parse_feed(response.body)
+        except ET.ParseError as e:
+            logger.error(f"Invalid YouTube feed for channel {handle}: {e}")
+            return None
+
+
+def parse_feed(body):
+    """Extract video ids, titles, URLs and publish times from an Atom feed."""
+    releases = []
+    for entry in ET.fromstring(body).iterfind('atom:entry', FEED_NAMESPACES):
+        video_id = entry.findtext('yt:videoId', namespaces=FEED_NAMESPACES)
+        if not video_id:
+            continue
+        releases.append({
+            'video_id': video_id,
+            'title': (entry.findtext('atom:title', default='', namespaces=FEED_NAMESPACES)).strip(),
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'published': entry.findtext('atom:published', namespaces=FEED_NAMESPACES),
+        })
+    return releases